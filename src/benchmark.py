@@ -0,0 +1,168 @@
+"""
+Cycle-time benchmark of the whole test sequence against the simulated jig.
+
+Runs JigEnvironment.run_test_cycle for a number of simulated units and reports per-stage
+wall time, I2C transactions per device and the resulting units/hour. The simulated jig has its
+own, empty calibration directory, so the figures are those of an uncalibrated fixture: default
+boot timing and fixed multiplexer waits.
+
+    python3 src/benchmark.py --units 3
+"""
+import argparse
+import json
+import logging
+import statistics
+import time
+from collections import Counter, defaultdict
+
+import variables
+
+variables.HARDWARE_BACKEND = "simulation"
+
+# Keep the report readable: driver logs still go to the log file
+logging.basicConfig(handlers=[logging.NullHandler()])
+
+from jig.JigEnvironment import JigEnvironment
+from jig.tests import pads_test, load_firmware_to_device
+from jig.jig_hardware_control.backends import get_simulated_jig
+
+I2C_DEVICE_NAMES = {
+    0x20: "TCA9535",
+    0x27: "LCD",
+    0x48: "ADS1015 0x48",
+    0x4B: "ADS1015 0x4B",
+}
+
+
+def count_transactions(sim, start, end):
+    return {
+        I2C_DEVICE_NAMES.get(address, f"0x{address:02x}"): count
+        for address, count in sim.transactions_between(start, end).items()
+    }
+
+
+def run_unit(jig, sim):
+    sim.clear_transaction_log()
+    sim.connect_device()
+    start = time.monotonic()
+    result = jig.run_test_cycle()
+    end = time.monotonic()
+    sim.disconnect_device()
+
+    marks = jig.stage_marks + [("END", end)]
+    stages = []
+    for (name, stage_start), (_, stage_end) in zip(marks, marks[1:]):
+        stages.append({
+            "stage": name,
+            "seconds": stage_end - stage_start,
+            "i2c": count_transactions(sim, stage_start, stage_end),
+        })
+
+    return {
+        "result": result,
+        "seconds": end - start,
+        "pad_latencies": [latency for values in pads_test.last_latencies.values() for latency in values],
+        "flash": dict(load_firmware_to_device.last_flash_metrics),
+        "i2c": count_transactions(sim, start, end),
+        "stages": stages,
+    }
+
+
+def summarize(units):
+    stage_seconds = defaultdict(list)
+    stage_i2c = defaultdict(Counter)
+    total_i2c = Counter()
+    for unit in units:
+        total_i2c.update(unit["i2c"])
+        for stage in unit["stages"]:
+            stage_seconds[stage["stage"]].append(stage["seconds"])
+            stage_i2c[stage["stage"]].update(stage["i2c"])
+
+    cycle_time = statistics.mean(unit["seconds"] for unit in units)
+    pad_latencies = [latency for unit in units for latency in unit["pad_latencies"]]
+    flashes = [unit["flash"] for unit in units if unit["flash"]]
+    return {
+        "units": len(units),
+        "failed": sum(1 for unit in units if unit["result"] != 0),
+        "cycle_seconds": cycle_time,
+        "units_per_hour": 3600 / cycle_time,
+        "stages": {
+            name: {
+                "mean": statistics.mean(seconds),
+                "min": min(seconds),
+                "max": max(seconds),
+                "i2c_per_unit": sum(stage_i2c[name].values()) / len(seconds),
+            }
+            for name, seconds in stage_seconds.items()
+        },
+        "i2c_per_unit": {name: count / len(units) for name, count in total_i2c.items()},
+        "pad_latency": {
+            "min": min(pad_latencies),
+            "median": statistics.median(pad_latencies),
+            "max": max(pad_latencies),
+        } if pad_latencies else None,
+        "flash": {
+            name: statistics.mean(flash[name] for flash in flashes) for name in ("write", "reboot", "total")
+        } if flashes else None,
+    }
+
+
+def print_report(units, summary):
+    for number, unit in enumerate(units, 1):
+        print(f"Unit {number}: result {unit['result']}, {unit['seconds']:.3f} s")
+
+    print()
+    print(f"{'Stage':<16}{'mean s':>10}{'min s':>10}{'max s':>10}{'I2C/unit':>12}")
+    for name, stage in summary["stages"].items():
+        print(f"{name:<16}{stage['mean']:>10.3f}{stage['min']:>10.3f}{stage['max']:>10.3f}"
+              f"{stage['i2c_per_unit']:>12.1f}")
+
+    print()
+    print("I2C transactions per unit:")
+    for name, count in sorted(summary["i2c_per_unit"].items()):
+        print(f"  {name:<14}{count:>10.1f}")
+
+    if summary["pad_latency"]:
+        latency = summary["pad_latency"]
+        print()
+        print(f"Pad latency:  {latency['min'] * 1000:.1f} / {latency['median'] * 1000:.1f} / "
+              f"{latency['max'] * 1000:.1f} ms (min / median / max)")
+
+    if summary["flash"]:
+        flash = summary["flash"]
+        print(f"Flash:        {flash['total'] * 1000:.1f} ms (write {flash['write'] * 1000:.1f} ms, "
+              f"reboot {flash['reboot'] * 1000:.1f} ms)")
+
+    print()
+    print(f"Failed units: {summary['failed']}/{summary['units']}")
+    print(f"Cycle time:   {summary['cycle_seconds']:.3f} s")
+    print(f"Units/hour:   {summary['units_per_hour']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, default=3, help="number of simulated units to test")
+    parser.add_argument("--json", action="store_true", help="print the raw results as JSON")
+    parser.add_argument("--alert-pins", action="store_true", help="wire the ADS1015 ALERT/RDY pins to the Pi")
+    args = parser.parse_args()
+
+    if args.alert_pins:
+        from jig.jig_hardware_control.simulation import ADS1015_ALERT_LINES
+        variables.ADS1015_ALERT_PINS = dict(ADS1015_ALERT_LINES)
+
+    sim = get_simulated_jig()
+    jig = JigEnvironment()
+
+    units = [run_unit(jig, sim) for _ in range(args.units)]
+    summary = summarize(units)
+
+    if args.json:
+        print(json.dumps({"summary": summary, "units": units}, indent=2))
+    else:
+        print_report(units, summary)
+
+    sim.stop()
+
+
+if __name__ == '__main__':
+    main()
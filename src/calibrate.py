@@ -0,0 +1,135 @@
+"""
+Per-fixture calibration runs. Results are stored in the calibration directory and picked up
+by the jig on the next start.
+
+    python3 src/calibrate.py mux-settle     # with a known-good device on the fixture
+    python3 src/calibrate.py adc --references 1.0 3.0 --channels 0
+    python3 src/calibrate.py boot-timing    # with a known-good flashed device on the fixture
+"""
+import argparse
+import time
+
+import variables
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+
+def prepare_device(pins, timeout=15):
+    """Power the device on the fixture and put it in test mode, so its LEDs drive the muxes."""
+    from jig.tests.midi_processes import find_midi_device, close_midi_connection_from_device, \
+        send_test_sysex_messages_to_midi_device
+
+    pins.usb_power_set(1, False)
+    pins.relay_set(2, 0)
+    time.sleep(1)
+    pins.usb_power_set(1, True)
+
+    deadline = time.monotonic() + timeout
+    while (res := find_midi_device()) is not None:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Device did not enumerate: {res}")
+        time.sleep(0.2)
+
+    if (res := send_test_sysex_messages_to_midi_device()) is not None:
+        raise RuntimeError(f"Failed to enter test mode: {res}")
+    close_midi_connection_from_device()
+
+
+def calibrate_mux_settle(args):
+    from jig.jig_hardware_control import devices
+    from jig.jig_hardware_control.mux_settling import calibrate_settle_profile
+
+    reader = devices.multiplexer_reader()
+    prepare_device(reader.pin_controller)
+
+    profile = calibrate_settle_profile(reader, window=args.window)
+    reader.pin_controller.usb_power_set(1, False)
+
+    for index, entry in sorted(profile.channels.items()):
+        print(f"Channel {index:2}: settles in {entry['settle_time'] * 1000:6.2f} ms, "
+              f"wait {entry['min_time'] * 1000:6.2f} ms, up to {entry['max_samples']} samples")
+    profile.save()
+    print(f"Saved to {variables.MUX_SETTLE_PROFILE_PATH}")
+
+
+def calibrate_adc(args):
+    import numpy as np
+    from jig.jig_hardware_control import devices
+    from jig.jig_hardware_control.adc_calibration import AdcCalibration
+
+    adc = devices.adc()
+    calibration = adc.calibration
+    adc.set_calibration(AdcCalibration())  # fit against the ideal conversion
+
+    readings = []
+    for reference in args.references:
+        input(f"Apply {reference:.3f} V to channels {args.channels} and press Enter")
+        samples = [adc.read_channels(args.channels) for _ in range(args.samples)]
+        readings.append(np.mean(samples, axis=0))
+        print("  measured " + ", ".join(f"{value:.4f} V" for value in readings[-1]))
+
+    calibration.fit_channels(args.channels, args.references, readings)
+    for channel in args.channels:
+        print(f"Channel {channel}: gain {calibration.gain[channel]:.5f}, offset {calibration.offset[channel]:+.5f} V")
+    calibration.save()
+    print(f"Saved to {variables.ADC_CALIBRATION_PATH}")
+
+
+def calibrate_boot_timing(args):
+    from jig.jig_hardware_control.boot_sequencer import BootTimingProfiles, calibrate_boot_timing, BOOT_STEPS
+    from jig.jig_hardware_control import devices
+    from jig.tests.load_firmware_to_device import find_uf2_drive
+
+    pins = devices.pin_controller()
+    pins.gpio_set_pin_direction(0, 1)
+    try:
+        timing, minimums = calibrate_boot_timing(pins, lambda: find_uf2_drive() is not None,
+                                                 trials=args.trials, margin=args.margin,
+                                                 resolution=args.resolution)
+    finally:
+        pins.relay_set(2, 0)
+        pins.usb_power_set(1, False)
+
+    for step in BOOT_STEPS:
+        print(f"{step:12}: {minimums[step] * 1000:7.1f} ms minimum, {timing[step] * 1000:7.1f} ms used")
+    print(f"Sequence: {sum(timing.values()):.3f} s")
+
+    profiles = BootTimingProfiles.load()
+    profiles.profiles[args.profile] = timing
+    profiles.save()
+    print(f"Saved as {args.profile} to {variables.BOOT_TIMING_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    mux_settle = subparsers.add_parser("mux-settle", help="learn per-channel multiplexer settling times")
+    mux_settle.add_argument("--window", type=float, default=0.05, help="sampling window per channel, seconds")
+    mux_settle.set_defaults(handler=calibrate_mux_settle)
+
+    adc = subparsers.add_parser("adc", help="fit per-channel ADC gain and offset against reference voltages")
+    adc.add_argument("--references", type=float, nargs="+", required=True, help="reference voltages, volts")
+    adc.add_argument("--channels", type=int, nargs="+", default=list(range(8)), help="ADC channels (0-7)")
+    adc.add_argument("--samples", type=int, default=32, help="conversions averaged per reference")
+    adc.set_defaults(handler=calibrate_adc)
+
+    boot_timing = subparsers.add_parser("boot-timing", help="find the shortest reliable bootloader entry delays")
+    boot_timing.add_argument("--trials", type=int, default=3, help="boots that must all succeed per candidate delay")
+    boot_timing.add_argument("--margin", type=float, default=1.5, help="factor applied to the minimal delays")
+    boot_timing.add_argument("--resolution", type=float, default=0.005, help="search resolution, seconds")
+    boot_timing.add_argument("--profile", default=variables.BOOT_TIMING_PROFILE, help="profile name to save")
+    boot_timing.set_defaults(handler=calibrate_boot_timing)
+
+    args = parser.parse_args()
+
+    if variables.HARDWARE_BACKEND == "simulation":
+        from jig.jig_hardware_control.backends import get_simulated_jig
+        get_simulated_jig().connect_device()
+
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
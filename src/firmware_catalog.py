@@ -0,0 +1,156 @@
+import hashlib
+import os
+import re
+import struct
+import threading
+
+import variables
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+UF2_BLOCK_SIZE = 512
+UF2_MAGIC_START0 = 0x0A324655
+UF2_MAGIC_START1 = 0x9E5D5157
+UF2_MAGIC_END = 0x0AB16F30
+UF2_FLAG_NOT_MAIN_FLASH = 0x00000001
+UF2_FLAG_FAMILY_ID_PRESENT = 0x00002000
+
+
+def parse_version(filename):
+    """(major, minor, patch) of a firmware file name, None if it does not match FIRMWARE_PATTERN."""
+    match = re.fullmatch(variables.FIRMWARE_PATTERN, filename)
+    if match is None:
+        return None
+    return tuple(int(part) for part in match.groups())
+
+
+def validate_uf2(data, family_id=variables.UF2_FAMILY_ID):
+    """
+    Checks that data is one complete UF2 image for the family: magic numbers of every block,
+    block numbers 0..n-1 in order with the same block count, and the family ID.
+
+    Returns the number of blocks, raises ValueError on the first problem.
+    """
+    if not data or len(data) % UF2_BLOCK_SIZE:
+        raise ValueError(f"size {len(data)} is not a multiple of {UF2_BLOCK_SIZE} bytes")
+
+    count = len(data) // UF2_BLOCK_SIZE
+    for index in range(count):
+        start = index * UF2_BLOCK_SIZE
+        magic_start0, magic_start1, flags, _, payload_size, block_no, num_blocks, block_family = \
+            struct.unpack_from("<8I", data, start)
+        magic_end, = struct.unpack_from("<I", data, start + UF2_BLOCK_SIZE - 4)
+
+        if (magic_start0, magic_start1, magic_end) != (UF2_MAGIC_START0, UF2_MAGIC_START1, UF2_MAGIC_END):
+            raise ValueError(f"block {index} has wrong magic numbers")
+        if flags & UF2_FLAG_NOT_MAIN_FLASH:
+            continue
+        if block_no != index or num_blocks != count:
+            raise ValueError(f"block {index} is numbered {block_no} of {num_blocks}, expected {index} of {count}")
+        if not flags & UF2_FLAG_FAMILY_ID_PRESENT or block_family != family_id:
+            raise ValueError(f"block {index} is not for family {family_id:#010x}")
+        if payload_size > 476:
+            raise ValueError(f"block {index} has payload size {payload_size}")
+    return count
+
+
+class FirmwareImage:
+    """A validated firmware file held in memory."""
+
+    def __init__(self, path, version, data, blocks):
+        self.path = path
+        self.version = version
+        self.data = data
+        self.blocks = blocks
+        self.sha256 = hashlib.sha256(data).hexdigest()
+
+    @property
+    def version_string(self):
+        return ".".join(str(part) for part in self.version)
+
+    @property
+    def display_version(self):
+        """Version in the jig screen format: last digit of major, two digits of minor and patch."""
+        major, minor, patch = (str(part) for part in self.version)
+        return f"{major[-1]}.{minor.zfill(2)[-2:]}.{patch.zfill(2)[-2:]}"
+
+
+class FirmwareCatalog:
+    """
+    Index of the firmware files in FIRMWARE_PATH, ordered by version.
+
+    The directory is listed again only when its mtime or inode changes (firmware_updater swaps in
+    a new directory, it does not rewrite files in place). The newest valid image is read once,
+    checked and kept in memory, so every flash writes the same verified buffer.
+    """
+
+    def __init__(self, path=variables.FIRMWARE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.files = []  # (version, file name), oldest first
+        self.image = None
+        self.rejected = {}  # file name -> reason, so a broken file is read only once per index
+
+    def refresh(self):
+        """Re-indexes the directory if it has changed. Returns True if it did."""
+        with self.lock:
+            return self.__refresh()
+
+    def __refresh(self):
+        try:
+            stat = os.stat(self.path)
+            mtime = (stat.st_ino, stat.st_mtime_ns)
+        except OSError as e:
+            logger.warn(f"Firmware directory {self.path} is not available: {e}")
+            mtime = None
+        if mtime == self.mtime and mtime is not None:
+            return False
+
+        self.mtime = mtime
+        files = []
+        if mtime is not None:
+            for entry in os.scandir(self.path):
+                if entry.is_file() and (version := parse_version(entry.name)) is not None:
+                    files.append((version, entry.name))
+        self.files = sorted(files)
+        self.rejected = {}
+        if self.image is not None and (self.image.version, self.image.path.name) not in self.files:
+            self.image = None
+        logger.info(f"Firmware files indexed: {[name for _, name in self.files]}")
+        return True
+
+    def versions(self):
+        with self.lock:
+            self.__refresh()
+            return [version for version, _ in self.files]
+
+    def latest(self):
+        """The newest valid firmware image, None if there is none."""
+        with self.lock:
+            self.__refresh()
+            for version, name in reversed(self.files):
+                if self.image is not None and self.image.path.name == name:
+                    return self.image
+                if name in self.rejected:
+                    continue
+
+                path = self.path / name
+                try:
+                    data = path.read_bytes()
+                    blocks = validate_uf2(data)
+                except (OSError, ValueError) as e:
+                    logger.warn(f"Firmware file {name} is not usable: {e}")
+                    self.rejected[name] = str(e)
+                    continue
+
+                self.image = FirmwareImage(path, version, data, blocks)
+                logger.info(f"Firmware {name}: {blocks} blocks, sha256 {self.image.sha256}")
+                return self.image
+
+            logger.warn("Don't see any valid firmware files")
+            return None
+
+
+catalog = FirmwareCatalog()
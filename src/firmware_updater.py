@@ -1,8 +1,15 @@
+import hashlib
+import json
 import os
+import re
+import shutil
 
 from base_logger import get_logger_for_file
 import variables
 import requests
+from firmware_catalog import catalog
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 firmware_logger = get_logger_for_file(__name__)
 
@@ -11,17 +18,82 @@ headers = {
     "X-GitHub-Api-Version": "2022-11-28",
 }
 
-def __get_last_release(owner, repo):
-    url = f"https://api.github.com/repos/{owner}/{repo}/releases/latest"
-    release = requests.get(url, headers=headers)
-
-    if release.status_code != 200:
+# Release metadata kept next to the firmware files: etag, release id, and size and sha256 of every asset
+RELEASE_INFO_FILE = ".release.json"
+# Download directory, kept between runs so an interrupted download continues where it stopped
+STAGING_PATH = variables.FIRMWARE_PATH.with_name(".firmware.download")
+PREVIOUS_PATH = variables.FIRMWARE_PATH.with_name(".firmware.previous")
+DOWNLOAD_CHUNK_SIZE = 16 * 1024  # also the most an interrupted download loses
+REQUEST_TIMEOUT = (5, 30)  # connect, read; seconds
+
+_session = None
+
+
+class FirmwareUpdateError(Exception):
+    pass
+
+
+def get_session():
+    """One pooled session for the API and the asset downloads, with retries on connection errors."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update(headers)
+        retries = Retry(total=3, connect=3, read=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                        allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retries)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def read_release_info(path):
+    try:
+        with open(path / RELEASE_INFO_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_release_info(path, info):
+    with open(path / RELEASE_INFO_FILE, "w") as f:
+        json.dump(info, f, indent=2)
+
+
+def is_complete(path, info):
+    """True if every asset of the release info is in the directory with its recorded size."""
+    assets = info.get("assets")
+    if not assets:
+        return False
+    for name, asset in assets.items():
+        try:
+            if (path / name).stat().st_size != asset["size"]:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def __get_last_release(owner, repo, etag=None):
+    """Returns (release, etag) of the latest release, (None, etag) if it has not changed since etag."""
+    url = f"{variables.FIRMWARE_API_URL}/repos/{owner}/{repo}/releases/latest"
+    request_headers = {"If-None-Match": etag} if etag else {}
+    response = get_session().get(url, headers=request_headers, timeout=REQUEST_TIMEOUT)
+
+    if response.status_code == 304:
+        firmware_logger.info(f"Latest release for {owner}/{repo} has not changed")
+        return None, etag
+
+    if response.status_code != 200:
         firmware_logger.error(f"Failed to get latest release for {owner}/{repo}")
-        raise Exception(f"Failed to get latest release for {owner}/{repo}")
+        raise FirmwareUpdateError(f"Failed to get latest release for {owner}/{repo}: {response.status_code}")
 
     firmware_logger.info(f"Success to get latest release for {owner}/{repo}")
 
-    release = release.json()
+    release = response.json()
+    assets = release.get("assets")
+    if assets is None:
+        assets = get_session().get(release["assets_url"], timeout=REQUEST_TIMEOUT).json()
 
     data = {
         "id": release["id"],
@@ -30,30 +102,143 @@ def __get_last_release(owner, repo):
         "assets": []
     }
 
-    assets_url = release["assets_url"]
-    assets = requests.get(assets_url, headers=headers).json()
-
     for asset in assets:
+        digest = asset.get("digest") or ""
         data["assets"].append({
             "url": asset["url"],
             "name": asset["name"],
+            "size": asset.get("size"),
+            "sha256": digest[len("sha256:"):] if digest.startswith("sha256:") else None,
         })
 
-    return data
+    return data, response.headers.get("ETag")
+
+
+def content_range_start(response):
+    """First byte of the Content-Range of a 206 response ("bytes 100-199/200"), None if there is none."""
+    match = re.match(r"bytes (\d+)-", response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def download_asset(asset, path):
+    """
+    Streams the asset to path/<name>.part, continuing a partial file with a Range request,
+    and renames it to path/<name> once its size and hash are verified. Returns the sha256.
+    A partial file the server cannot continue is deleted and the asset downloaded from the start.
+    """
+    part_path = path / f"{asset['name']}.part"
+    digest = hashlib.sha256()
+    offset = 0
+    if part_path.is_file():
+        with open(part_path, "rb") as f:
+            while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                offset += len(chunk)
+
+    while True:
+        request_headers = {"Accept": "application/octet-stream"}
+        if offset:
+            request_headers["Range"] = f"bytes={offset}-"
+
+        with get_session().get(asset["url"], headers=request_headers, stream=True,
+                               timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code == 416 and offset == asset["size"]:
+                break  # the previous run stopped after the last byte
+
+            # Larger than the asset, left from a replaced asset, or a server answering another range
+            if offset and (response.status_code == 416 or
+                           response.status_code == 206 and content_range_start(response) != offset):
+                firmware_logger.warning(f"Cannot resume {asset['name']} at {offset} bytes "
+                                        f"({response.status_code} {response.headers.get('Content-Range')}), "
+                                        f"downloading it again")
+                part_path.unlink()
+                digest, offset = hashlib.sha256(), 0
+                continue
+
+            if response.status_code == 206 and offset:
+                firmware_logger.info(f"Resuming {asset['name']} at {offset} bytes")
+            elif response.status_code == 200:
+                digest, offset = hashlib.sha256(), 0
+            else:
+                raise FirmwareUpdateError(f"Failed to download {asset['name']}: {response.status_code}")
+
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    offset += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            break
+
+    sha256 = digest.hexdigest()
+    if asset["size"] is not None and offset != asset["size"]:
+        part_path.unlink()
+        raise FirmwareUpdateError(f"{asset['name']} is {offset} bytes, expected {asset['size']}")
+    if asset["sha256"] is not None and sha256 != asset["sha256"]:
+        part_path.unlink()
+        raise FirmwareUpdateError(f"{asset['name']} sha256 {sha256} does not match {asset['sha256']}")
+
+    os.replace(part_path, path / asset["name"])
+    firmware_logger.info(f"Downloaded {asset['name']}, {offset} bytes, sha256 {sha256}")
+    return sha256
+
+
+def swap_firmware_directory():
+    """Replaces FIRMWARE_PATH with the staging directory, keeping the old one if the rename fails."""
+    shutil.rmtree(PREVIOUS_PATH, ignore_errors=True)
+    if not variables.FIRMWARE_PATH.exists():
+        os.replace(STAGING_PATH, variables.FIRMWARE_PATH)
+        return
+
+    os.replace(variables.FIRMWARE_PATH, PREVIOUS_PATH)
+    try:
+        os.replace(STAGING_PATH, variables.FIRMWARE_PATH)
+    except OSError:
+        os.replace(PREVIOUS_PATH, variables.FIRMWARE_PATH)
+        raise
+    shutil.rmtree(PREVIOUS_PATH, ignore_errors=True)
 
 
 def update_firmware_files(owner, repo):
-    for filename in os.listdir(variables.FIRMWARE_PATH):
-        file_path = os.path.join(variables.FIRMWARE_PATH, filename)
-        os.remove(file_path)
-
-    assets = __get_last_release(owner, repo)["assets"]
-
-    headers_download = headers.copy()
-    headers_download["Accept"] = "application/octet-stream"
-
-    for asset in assets:
-        asset_binary = requests.get(asset["url"], headers=headers_download)
-        with open(variables.FIRMWARE_PATH / f"{asset['name']}", "wb") as f:
-            f.write(asset_binary.content)
-
+    """
+    Brings FIRMWARE_PATH to the latest release. The current files stay in place until the whole
+    release has been downloaded and verified, so a failed update leaves the previous firmware.
+
+    Returns True if the firmware files have changed.
+    """
+    current = read_release_info(variables.FIRMWARE_PATH)
+    etag = current.get("etag") if is_complete(variables.FIRMWARE_PATH, current) else None
+
+    try:
+        release, etag = __get_last_release(owner, repo, etag)
+        if release is None:
+            return False
+
+        if release["id"] == current.get("id") and is_complete(variables.FIRMWARE_PATH, current):
+            firmware_logger.info(f"Release {release['name']} is already downloaded")
+            write_release_info(variables.FIRMWARE_PATH, {**current, "etag": etag})
+            return False
+
+        # Partial files belong to the release they were started for
+        if read_release_info(STAGING_PATH).get("id") != release["id"]:
+            shutil.rmtree(STAGING_PATH, ignore_errors=True)
+        os.makedirs(STAGING_PATH, exist_ok=True)
+        write_release_info(STAGING_PATH, {"id": release["id"], "name": release["name"]})
+
+        assets = {}
+        for asset in release["assets"]:
+            sha256 = download_asset(asset, STAGING_PATH)
+            assets[asset["name"]] = {"size": (STAGING_PATH / asset["name"]).stat().st_size, "sha256": sha256}
+
+        write_release_info(STAGING_PATH, {"id": release["id"], "name": release["name"], "etag": etag,
+                                          "assets": assets})
+        # A flash reading the directory at the same time sees either the old or the new one
+        with catalog.lock:
+            swap_firmware_directory()
+    except (requests.RequestException, OSError, FirmwareUpdateError) as e:
+        firmware_logger.error(f"Firmware update failed, keeping the current files: {e}")
+        return False
+
+    firmware_logger.info(f"Firmware updated to release {release['name']}")
+    return True
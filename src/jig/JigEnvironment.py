@@ -4,16 +4,16 @@ import variables
 from base_logger import get_logger_for_file
 import threading
 
-from jig.jig_hardware_control.pin_controller import PinController
-from jig.jig_hardware_control.Display import Display
+from jig.jig_hardware_control.boot_sequencer import BootTimingProfiles, boot_into_bootloader
+from jig.jig_hardware_control import devices
 from jig.jig_hardware_control.rgb_led import RgbColorsEnum
 
+from jig.tests.boot_readiness import wait_for_device_ready
 from jig.tests.load_firmware_to_device import load_firmware_to_device
 from jig.tests.midi_processes import find_midi_device, close_midi_connection_from_device, \
     send_enable_logs_sysex_messages_to_midi_device, send_test_sysex_messages_to_midi_device
 from jig.tests.pads_test import pads_test
 
-from jig.tests.serial_tests import SerialTests
 from jig.tests.led_tests import led_tests
 
 
@@ -23,19 +23,21 @@ class JigEnvironment:
     _instance = None
 
     def __init__(self,):
-        self.pins = PinController()
-        self.screen = Display()  # Инициализируем Screen через класс Screen
-        self.serial = SerialTests()
+        self.pins = devices.pin_controller()
+        self.screen = devices.display()  # Инициализируем Screen через класс Screen
+        self.serial = devices.serial_tests()
         self.error_code = None  # To display errors
         self.pins.gpio_set_pin_direction(0, 1)  # pin 0 port 0 as input (1)
         self.current_test_function = ""  # Новый атрибут для текущей функции
         self.test_start_time = 0  # Инициализируем время старта теста
         self.execution_time = 0  # Переменная для отсчета времени выполнения теста
         self.max_test_time = variables.MAX_TEST_TIME  # Максимальное время выполнения тестов
-        self.debounce_time = 0.05  # 50 миллисекунд для защиты от дребезга
-        self.debounce_check_count = 2
+        self.debounce_time = variables.INPUT_DEBOUNCE_TIME  # 50 миллисекунд для защиты от дребезга
+        self.lever_check_interval = 0.01
         self.current_pin_state = 0
         self.stop_event = False
+        self.stage_marks = []  # (stage name, time.monotonic()) of the last test cycle
+        self.boot_timing = BootTimingProfiles.load().get(variables.BOOT_TIMING_PROFILE)
 
         self.last_pin_state = self.pins.gpio_read_pin(0)  # Начальное состояние пина
 
@@ -43,6 +45,8 @@ class JigEnvironment:
         self.pins.usb_power_set(1, False)
         self.pins.relay_set(2, 0)  # TODO check gpio boots
         self.pins.relay_set(1, 0)
+        # The expander comes up with every output low, which enables all multiplexers at once
+        devices.multiplexer_reader()
 
         logger.info("Screen updated to waiting state.")
 
@@ -54,7 +58,6 @@ class JigEnvironment:
 
     def init_jig_main_cycle(self):
         logger.info("Entering main loop...")
-        time.sleep(1)
 
         self.__device_disconnected()
 
@@ -72,49 +75,33 @@ class JigEnvironment:
             # При завершении программы включаем USB 1
             logger.info("USB port 1: ON")
             self.pins.usb_power_set(1, False)  # Включаем USB 1
+            self.screen.flush(timeout=1)
 
     def __main_cycle(self):
-        if not self.__is_pin_status_changed():
-            return
+        # Sleeps on the expander INT line until the lever moves and settles
+        self.pins.wait_for_pin(0, 1 - self.last_pin_state, debounce=self.debounce_time)
+        self.current_pin_state = self.last_pin_state = 1 - self.last_pin_state
+        logger.info(f"Pin state after debounce: {self.current_pin_state}")
 
         if self.current_pin_state == 0:
             self.__device_connected()
         elif self.current_pin_state == 1:
             self.__device_disconnected()
 
-    def __is_pin_status_changed(self):
-        logger.debug(f"Current pin state: {self.current_pin_state}")
-
-        for checks in range(self.debounce_check_count):
-            self.current_pin_state = self.pins.gpio_read_pin(0)
-            if self.current_pin_state == self.last_pin_state:
-                if checks != 0:
-                    logger.warn("Debounce check failed")
-                logger.debug("Device status has not changed")
-                return False
-            if checks == 0:
-                logger.info(
-                    f"Pin state changed from {self.last_pin_state} to {self.current_pin_state}."
-                    f" Waiting for debounce time..."
-                )
-            time.sleep(self.debounce_time)
-
-        logger.info("Debounce check finished successfully")
-        logger.info(f"Pin state after debounce: {self.current_pin_state}")
-
-        self.last_pin_state = self.current_pin_state
-        logger.info(f"Last pin state updated to: {self.last_pin_state}")
-        return True
-
-    def __device_connected(self):
-        logger.info("Pin state is 0, starting test sequence...")
-
+    def run_test_cycle(self):
+        """Runs one full test of the connected device and returns the result code."""
         result = self.__launch_test_process()
 
         close_midi_connection_from_device()
         self.serial.stop_serial()
 
         self.pins.usb_power_set(1, False)
+        return result
+
+    def __device_connected(self):
+        logger.info("Pin state is 0, starting test sequence...")
+
+        result = self.run_test_cycle()
 
         if result != 0:
             logger.warn(f"Test sequence finished with error code: {self.error_code}")
@@ -127,53 +114,63 @@ class JigEnvironment:
             self.screen.set_color(RgbColorsEnum.GREEN)
 
 
-        start_time = time.time()
-        while True:
-            elapsed_time = time.time() - start_time
-            if elapsed_time > 3 and self.pins.gpio_read_pin(0) == 1:
-                break
+        # Show the result for at least 3 seconds and until the lever is opened
+        start_time = time.monotonic()
+        self.pins.wait_for_pin(0, 1, debounce=self.debounce_time)
+        remaining = start_time + 3 - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
 
     def __launch_test_process(self):
         state = [0]
         self.stop_event = False
+        self.stage_marks = []
         thread = threading.Thread(target=self.__test_process, args=(state, ))
 
         thread.start()
-        start_time = time.time()
-        while True:
-            elapsed_time = time.time() - start_time
-            if elapsed_time > variables.MAX_TEST_TIME:
+        deadline = time.monotonic() + variables.MAX_TEST_TIME
+        while thread.is_alive():
+            if time.monotonic() > deadline:
                 logger.warn("Test cycle is stuck.")
                 self.stop_event = True
                 thread.join()
                 return 10
 
-            if self.pins.gpio_read_pin(0) == 1:
+            # The expander is read only after its INT line reported a change
+            if self.pins.input_edge_pending() and self.pins.wait_for_pin(0, 1, timeout=0, debounce=self.debounce_time):
                 logger.warn("The lever was unset.")
                 self.stop_event = True
                 thread.join()
                 return 9
 
-            if not thread.is_alive():
-                logger.info("Test cycle completed.")
-                return state[0]
+            thread.join(timeout=self.lever_check_interval)
+
+        logger.info("Test cycle completed.")
+        return state[0]
 
     def __test_process(self, state):
         try:
+            self.__mark_stage("BOOT")
             self.screen.set_text("FLASH")
             self.screen.set_color(RgbColorsEnum.PURPLE)
 
             self.__boot_device()
             self.pins.usb_power_set(1, True)
 
+            self.__mark_stage("FLASH")
             if (res := load_firmware_to_device()) is not None or self.stop_event:
                 logger.warn(f"Load firmware test is failed: {res}")
                 state[0] = 1
                 return
 
+            self.__mark_stage("AWAIT BOOTING")
             self.screen.set_text(f"AWAIT BOOTING")
-            time.sleep(10)
+            if (res := wait_for_device_ready(should_stop=lambda: self.stop_event)) is not None or self.stop_event:
+                logger.warn(f"Device boot is failed: {res}")
+                state[0] = 6
+                return
 
+            self.__mark_stage("MIDI")
             self.screen.set_text("TESTING")
 
             if (res := find_midi_device()) is not None or self.stop_event:
@@ -196,16 +193,19 @@ class JigEnvironment:
                 state[0] = 2
                 return
 
+            self.__mark_stage("LED")
             if (res := led_tests()) is not None or self.stop_event:
                 logger.warn(f"Led test is failed: {res}")
                 state[0] = 3
                 return
 
+            self.__mark_stage("SERIAL")
             if (res := self.serial.start_serial()) is not None or self.stop_event:
                 logger.warn(f"Serial test is failed: {res}")
                 state[0] = 4
                 return
 
+            self.__mark_stage("PADS")
             if (res := pads_test()) is not None or self.stop_event:
                 logger.warn(f"Pad test is failed: {res}")
                 state[0] = 5
@@ -218,6 +218,7 @@ class JigEnvironment:
 
             self.screen.set_color(RgbColorsEnum.PURPLE)
 
+            self.__mark_stage("DONE")
             logger.info("Test sequence started.")
 
             logger.info("Test sequence completed successfully.")
@@ -228,16 +229,13 @@ class JigEnvironment:
             state[0] = -1
             return
 
+    def __mark_stage(self, name):
+        self.stage_marks.append((name, time.monotonic()))
+        logger.debug(f"Stage {name} started")
+
     def __boot_device(self):
-        logger.info(f"Boot device")
-        self.pins.usb_power_set(1, False)
-        time.sleep(1)
-        self.pins.relay_set(2, 1)
-        time.sleep(1)
-        self.pins.usb_power_set(1, True)
-        time.sleep(1)
-        self.pins.relay_set(2, 0)
-        time.sleep(1)
+        logger.info(f"Boot device {self.boot_timing}")
+        boot_into_bootloader(self.pins, self.boot_timing)
 
     def __device_disconnected(self):
         logger.info("Board removed, ready for next test")
@@ -1,5 +1,6 @@
-from .I2CLCD import I2CLCD
-from .rgb_led import RgbLed
+import threading
+
+from . import devices
 
 import variables
 from base_logger import get_logger_for_file
@@ -8,38 +9,84 @@ logger = get_logger_for_file(__name__)
 
 
 class Display:
-    _instance = None
-
     def __init__(self):
-        self.screen = I2CLCD(address=variables.SCREEN_ADDRESS,
-                             cols=variables.SCREEN_COLUMNS,
-                             rows=variables.SCREEN_ROWS)
-        self.rgb_led = RgbLed()
+        self.screen = devices.lcd()
+        self.rgb_led = devices.rgb_led()
         self.device_count = 0
+        self.text = ""
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+        # What the LCD currently shows (init_lcd leaves it cleared) and the DDRAM cursor, None if unknown
+        self.frame = [bytearray(b" " * variables.SCREEN_COLUMNS) for _ in range(variables.SCREEN_ROWS)]
+        self.cursor = None
+
+        # Latest requested frame and color, rendered by the worker; intermediate states are dropped
+        self.condition = threading.Condition()
+        self.pending_frame = None
+        self.pending_color = None
+        self.requested = 0  # update counter, to let flush() wait for the worker
+        self.rendered = 0
+        self.worker = threading.Thread(target=self.__worker, name="display", daemon=True)
+        self.worker.start()
 
     def set_text(self, text):
         if not self.__validate_text_for_screen(text):
             logger.warning("Some problems with text")
             return False
 
-        self.screen.clear()
+        with self.condition:
+            self.text = text
+            self.__request_frame()
+
+    def refresh(self):
+        """Shows the current text again, with the version and counter row rebuilt from their sources."""
+        with self.condition:
+            self.__request_frame()
 
-        self.screen.set_cursor(0, 0)
-        self.screen.write(text)
-        self.screen.set_cursor(0, 1)
-        self.screen.write(variables.JIG_FIRMWARE_VERSION)
-        self.screen.set_cursor(4, 1)
-        self.screen.write(variables.DEVICE_FIRMWARE_VERSION)
-        self.screen.set_cursor(variables.SCREEN_COLUMNS - 4, 1)
-        self.screen.write(f"{self.device_count:04}")
+    def __request_frame(self):
+        self.pending_frame = [
+            self.__compose_row((0, self.text)),
+            self.__compose_row((0, variables.JIG_FIRMWARE_VERSION),
+                               (4, variables.DEVICE_FIRMWARE_VERSION),
+                               (variables.SCREEN_COLUMNS - 4, f"{self.device_count:04}")),
+        ]
+        self.requested += 1
+        self.condition.notify_all()
 
     def set_color(self, color):
-        self.rgb_led.set_color(color)
+        with self.condition:
+            self.pending_color = color
+            self.requested += 1
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until every update requested so far is on the LCD and LED. Returns False on timeout."""
+        with self.condition:
+            requested = self.requested
+            return self.condition.wait_for(lambda: self.rendered >= requested, timeout)
+
+    def __worker(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.rendered < self.requested)
+                requested = self.requested
+                frame, self.pending_frame = self.pending_frame, None
+                color, self.pending_color = self.pending_color, None
+
+            try:
+                if frame is not None:
+                    self.__render(frame)
+                if color is not None:
+                    self.rgb_led.set_color(color)
+            except Exception as e:
+                logger.error(f"Failed to update the display: {e}")
+                # The LCD content is unknown now, the next update rewrites every cell
+                for shown in self.frame:
+                    shown[:] = b"\xff" * len(shown)
+                self.cursor = None
+
+            with self.condition:
+                self.rendered = requested
+                self.condition.notify_all()
 
     def __validate_text_for_screen(self, text):
         if len(text) > variables.SCREEN_COLUMNS:
@@ -48,3 +95,38 @@ class Display:
 
         return True
 
+    def __compose_row(self, *fields):
+        """Builds one row from (column, text) fields, later fields overwrite earlier ones."""
+        row = bytearray(b" " * variables.SCREEN_COLUMNS)
+        for column, text in fields:
+            data = text.encode("ascii", "replace")[:variables.SCREEN_COLUMNS - column]
+            row[column:column + len(data)] = data
+        return row
+
+    def __render(self, frame):
+        """Sends only the changed cells, one cursor move per run of changes."""
+        segments = []
+        for row_number, (shown, row) in enumerate(zip(self.frame, frame)):
+            changed = [column for column in range(variables.SCREEN_COLUMNS) if shown[column] != row[column]]
+            if not changed:
+                continue
+
+            # Runs of changed cells; a one-cell gap costs the same as a cursor move, so it is rewritten
+            runs = [[changed[0], changed[0]]]
+            for column in changed[1:]:
+                if column - runs[-1][1] <= 2:
+                    runs[-1][1] = column
+                else:
+                    runs.append([column, column])
+
+            for start, end in runs:
+                if self.cursor == (start, row_number):
+                    segments.append((None, None, row[start:end + 1].decode("ascii")))
+                else:
+                    segments.append((start, row_number, row[start:end + 1].decode("ascii")))
+                self.cursor = (end + 1, row_number) if end + 1 < variables.SCREEN_COLUMNS else None
+
+            shown[:] = row
+
+        # The whole update goes to the LCD as one I2C transaction
+        self.screen.write_segments(segments)
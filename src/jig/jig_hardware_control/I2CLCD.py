@@ -1,5 +1,8 @@
-import smbus2
 import time
+from functools import lru_cache
+
+from .backends import i2c_msg_write
+from .i2c_bus import shared_bus, PRIORITY_BULK
 
 # Constants for LCD commands
 LCD_CLEARDISPLAY = 0x01
@@ -48,11 +51,47 @@ En = 0b00000100  # Enable bit
 Rw = 0b00000010  # Read/Write bit
 Rs = 0b00000001  # Register select bit
 
-class I2CLCD:
-    _instance = None
+# DDRAM address of the first column of every row
+ROW_OFFSETS = (0x00, 0x40, 0x14, 0x54)
+
+
+def encode(values, backlight):
+    """
+    Encodes (value, mode) pairs into the PCF8574 byte stream that clocks them into the LCD.
+
+    Every nibble is one byte with En high followed by the same byte with En low; the HD44780
+    latches on the falling edge. A setup byte with En low is only needed when RS changes.
+    At 100 kHz one byte takes ~90 us on the bus, longer than the 37 us the LCD needs per
+    instruction, so the stream needs no delays.
+    """
+    stream = bytearray()
+    previous_mode = None
+    for value, mode in values:
+        if mode != previous_mode:
+            stream.append(mode | (value & 0xF0) | backlight)
+            previous_mode = mode
+        for nibble in (value & 0xF0, (value << 4) & 0xF0):
+            bits = mode | nibble | backlight
+            stream.append(bits | En)
+            stream.append(bits)
+    return bytes(stream)
 
+
+@lru_cache(maxsize=256)
+def encode_segment(address, text, backlight):
+    """
+    Compiled stream of an optional cursor move to a DDRAM address followed by text.
+
+    Cached, so recurring screens ("CONNECT DEVICE", "FLASH", "ERROR 07", ...) are encoded once.
+    """
+    values = [] if address is None else [(LCD_SETDDRAMADDR | address, 0)]
+    values.extend((byte, Rs) for byte in text.encode("ascii", "replace"))
+    return encode(values, backlight)
+
+
+class I2CLCD:
     def __init__(self, address, cols, rows, bus=1):
-        self.bus = smbus2.SMBus(bus)
+        self.bus = shared_bus(bus, PRIORITY_BULK)
         self.address = address
         self.cols = cols
         self.rows = rows
@@ -62,11 +101,6 @@ class I2CLCD:
         self.displaymode = LCD_ENTRYLEFT | LCD_ENTRYSHIFTDECREMENT
         self.init_lcd()
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
     def write_command(self, cmd):
         """Send command to the LCD."""
         self.send(cmd, 0)
@@ -77,17 +111,28 @@ class I2CLCD:
 
     def send(self, data, mode):
         """Send data or command."""
-        high_nibble = mode | (data & 0xF0) | self.backlightval
-        low_nibble = mode | ((data << 4) & 0xF0) | self.backlightval
-        self.expander_write(high_nibble)
-        self.pulse_enable(high_nibble)
-        self.expander_write(low_nibble)
-        self.pulse_enable(low_nibble)
-        
+        self.send_stream(encode([(data, mode)], self.backlightval))
+
+    def send_stream(self, stream):
+        """Send an encoded byte stream in a single I2C transaction."""
+        self.bus.i2c_rdwr(i2c_msg_write(self.address, stream))
+
     def write(self, text):
         """Write a string to the display."""
-        for char in text:
-            self.write_data(ord(char))
+        self.send_stream(encode_segment(None, text, self.backlightval))
+
+    def write_segments(self, segments):
+        """
+        Write several pieces of text in one transaction.
+
+        segments: (col, row, text) tuples; col and row None continue at the current cursor.
+        """
+        stream = b"".join(
+            encode_segment(None if row is None else self.ddram_address(col, row), text, self.backlightval)
+            for col, row, text in segments
+        )
+        if stream:
+            self.send_stream(stream)
 
     def expander_write(self, data):
         """Write data to the I2C expander."""
@@ -110,12 +155,14 @@ class I2CLCD:
         self.write_command(LCD_RETURNHOME)
         time.sleep(0.002)
 
-    def set_cursor(self, col, row):
-        """Set the cursor position."""
-        row_offsets = [0x00, 0x40, 0x14, 0x54]
+    def ddram_address(self, col, row):
         if row > self.rows:
             row = self.rows - 1
-        self.write_command(LCD_SETDDRAMADDR | (col + row_offsets[row]))
+        return col + ROW_OFFSETS[row]
+
+    def set_cursor(self, col, row):
+        """Set the cursor position."""
+        self.write_command(LCD_SETDDRAMADDR | self.ddram_address(col, row))
 
     def display(self):
         """Turn on the display."""
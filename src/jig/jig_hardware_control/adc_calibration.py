@@ -0,0 +1,72 @@
+import numpy as np
+
+import variables
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+ADC_CHANNELS = 8
+
+
+class AdcCalibration:
+    """
+    Per-channel linear correction of the ADS1015 inputs (0-7).
+
+    The corrected voltage is ideal_voltage * gain[channel] + offset[channel], where ideal_voltage
+    is the nominal PGA and voltage divider conversion. The table is stored as a small .npz file.
+    """
+
+    def __init__(self, gain=None, offset=None):
+        self.gain = np.ones(ADC_CHANNELS) if gain is None else np.asarray(gain, dtype=np.float64)
+        self.offset = np.zeros(ADC_CHANNELS) if offset is None else np.asarray(offset, dtype=np.float64)
+
+    @property
+    def is_identity(self):
+        return bool(np.all(self.gain == 1) and np.all(self.offset == 0))
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or variables.ADC_CALIBRATION_PATH
+        if not path.is_file():
+            logger.info(f"No ADC calibration at {path}, using the ideal conversion")
+            return cls()
+
+        try:
+            with np.load(path) as table:
+                gain, offset = table["gain"], table["offset"]
+            if gain.shape != (ADC_CHANNELS,) or offset.shape != (ADC_CHANNELS,):
+                raise ValueError(f"unexpected table shape {gain.shape}, {offset.shape}")
+            logger.info(f"ADC calibration loaded from {path}")
+            return cls(gain, offset)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load ADC calibration {path}: {e}")
+            return cls()
+
+    def save(self, path=None):
+        path = path or variables.ADC_CALIBRATION_PATH
+        with open(path, "wb") as f:
+            np.savez(f, gain=self.gain, offset=self.offset)
+        logger.info(f"ADC calibration saved to {path}")
+
+    def fit_channels(self, channels, references, readings):
+        """
+        Least-squares fit of gain and offset for the given channels; other channels keep their values.
+
+        :param channels: Calibrated channels (0-7).
+        :param references: Reference voltages applied to the inputs, shape (n,), n >= 2.
+        :param readings: Ideal-conversion readings at those references, shape (n, len(channels)).
+        """
+        channels = np.asarray(channels)
+        references = np.asarray(references, dtype=np.float64)
+        readings = np.asarray(readings, dtype=np.float64)
+        if len(references) < 2:
+            raise ValueError("At least two reference voltages are needed")
+
+        deviation = readings - readings.mean(axis=0)
+        spread = (deviation ** 2).sum(axis=0)
+        if np.any(spread == 0):
+            raise ValueError(f"Channels {channels[spread == 0].tolist()} do not follow the reference voltage")
+
+        gain = (deviation * (references - references.mean())[:, None]).sum(axis=0) / spread
+        self.gain[channels] = gain
+        self.offset[channels] = references.mean() - gain * readings.mean(axis=0)
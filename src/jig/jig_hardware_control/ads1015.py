@@ -1,6 +1,12 @@
-import smbus2 as smbus
 import time
 
+import numpy as np
+
+import variables
+from .adc_calibration import AdcCalibration
+from .backends import open_gpio_chip, gpio_line_request_falling_edge
+from .i2c_bus import shared_bus, PRIORITY_MEASUREMENT
+
 # Addresses of the devices on the I2C bus
 ADS1015_ADDRESS_1 = 0x48  # Address of the first ADC
 ADS1015_ADDRESS_2 = 0x4B  # Address of the second ADC
@@ -8,9 +14,13 @@ ADS1015_ADDRESS_2 = 0x4B  # Address of the second ADC
 # Pointer register
 ADS1015_REG_POINTER_CONVERT = 0x00
 ADS1015_REG_POINTER_CONFIG = 0x01
+ADS1015_REG_POINTER_LOWTHRESH = 0x02
+ADS1015_REG_POINTER_HITHRESH = 0x03
 
 # Basic configuration settings
 ADS1015_CONFIG_OS_SINGLE = 0x8000  # Start a single conversion
+ADS1015_CONFIG_OS_IDLE = 0x8000  # When read: no conversion in progress
+ADS1015_CONFIG_MODE_CONTINUOUS = 0x0000  # Continuous-conversion mode
 ADS1015_CONFIG_MODE_SINGLE = 0x0100  # Single-shot mode
 
 # Multiplexer settings (for single-ended measurements)
@@ -27,17 +37,193 @@ ADS1015_PGA_1_024V = 0x0600  # +/-1.024V range
 ADS1015_PGA_0_512V = 0x0800  # +/-0.512V range
 ADS1015_PGA_0_256V = 0x0A00  # +/-0.256V range
 
+# Full-scale voltage of each PGA setting
+ADS1015_PGA_FULL_SCALE = {
+    ADS1015_PGA_6_144V: 6.144,
+    ADS1015_PGA_4_096V: 4.096,
+    ADS1015_PGA_2_048V: 2.048,
+    ADS1015_PGA_1_024V: 1.024,
+    ADS1015_PGA_0_512V: 0.512,
+    ADS1015_PGA_0_256V: 0.256
+}
+
+# Compensation for the voltage divider (820kΩ and 120kΩ) in front of every input
+DIVIDER_COEFFICIENT = 1 + (820 / 120)
+
+# Comparator settings
+ADS1015_CONFIG_COMP_MODE_WINDOW = 0x0010  # Window comparator: ALERT outside [Lo_thresh, Hi_thresh]
+ADS1015_CONFIG_COMP_POL_ACTIVE_LOW = 0x0000  # ALERT/RDY pulled low when asserted (default)
+ADS1015_CONFIG_COMP_NONLATCHING = 0x0000  # ALERT/RDY follows the latest conversion (default)
+ADS1015_CONFIG_CQUE_1CONV = 0x0000  # Assert ALERT/RDY after one conversion
 ADS1015_CONFIG_CQUE_NONE = 0x0003 # Disable the comparator and put ALERT/RDY in high state (default)
 
+# Threshold values that turn ALERT/RDY into a conversion-ready signal
+ADS1015_RDY_HITHRESH = 0x8000
+ADS1015_RDY_LOWTHRESH = 0x0000
+
 # Data rate settings
+ADS1015_DR_128SPS = 0x0000  # 128 samples per second
+ADS1015_DR_250SPS = 0x0020  # 250 samples per second
+ADS1015_DR_490SPS = 0x0040  # 490 samples per second
+ADS1015_DR_920SPS = 0x0060  # 920 samples per second
 ADS1015_DR_1600SPS = 0x0080  # 1600 samples per second (default)
+ADS1015_DR_2400SPS = 0x00A0  # 2400 samples per second
+ADS1015_DR_3300SPS = 0x00C0  # 3300 samples per second
+
+ADS1015_DATA_RATES = {
+    ADS1015_DR_128SPS: 128,
+    ADS1015_DR_250SPS: 250,
+    ADS1015_DR_490SPS: 490,
+    ADS1015_DR_920SPS: 920,
+    ADS1015_DR_1600SPS: 1600,
+    ADS1015_DR_2400SPS: 2400,
+    ADS1015_DR_3300SPS: 3300,
+}
+
+# The internal oscillator is specified to +/-10%
+ADS1015_CONVERSION_TIME_MIN = 0.9
+ADS1015_CONVERSION_TIME_MAX = 1.1
+ADS1015_CONVERSION_TIMEOUT = 0.1
+
+def values_in_range(values, min_value, max_value):
+    """Returns a boolean NumPy array: which of the values fall within [min_value, max_value]."""
+    values = np.asarray(values)
+    return (values >= min_value) & (values <= max_value)
+
+
+class WindowComparator:
+    """
+    Pass/fail checks of one channel against a voltage window, decided by the chip.
+
+    The thresholds and a continuous-conversion config are written once. Only with the chip's
+    ALERT/RDY pin wired (variables.ADS1015_ALERT_PINS) is the verdict the chip's: every check is a
+    GPIO read and the conversion register is read only on failure. Without it - the current jig -
+    a check is one conversion register read compared as a raw code on the host. Use through
+    ADS1015.window_comparator().
+    """
+
+    def __init__(self, adc, channel, min_value, max_value, pga, sps):
+        self.adc = adc
+        self.channel = channel
+        self.pga = pga
+        self.address, mux = adc._channel_address_and_mux(channel)
+        self.low_code, self.high_code = adc.window_codes(channel, min_value, max_value, pga)
+        self.config = (mux | pga | sps | ADS1015_CONFIG_MODE_CONTINUOUS | ADS1015_CONFIG_COMP_MODE_WINDOW
+                       | ADS1015_CONFIG_COMP_POL_ACTIVE_LOW | ADS1015_CONFIG_COMP_NONLATCHING | ADS1015_CONFIG_CQUE_1CONV)
+        self.period = 1 / ADS1015_DATA_RATES[sps]
+        self.line = adc.alert_lines.get(self.address)
+
+    def __enter__(self):
+        with self.adc.bus.transaction():
+            self.adc._write_register(self.address, ADS1015_REG_POINTER_LOWTHRESH, (self.low_code << 4) & 0xFFFF)
+            self.adc._write_register(self.address, ADS1015_REG_POINTER_HITHRESH, (self.high_code << 4) & 0xFFFF)
+            self.adc._write_register(self.address, ADS1015_REG_POINTER_CONFIG, self.config)
+        return self
+
+    def __exit__(self, *exc):
+        self.adc._write_register(self.address, ADS1015_REG_POINTER_CONFIG, self.config | ADS1015_CONFIG_MODE_SINGLE)
+        if self.line is not None:
+            # Give ALERT/RDY back to the conversion-ready function
+            self.adc._write_register(self.address, ADS1015_REG_POINTER_HITHRESH, ADS1015_RDY_HITHRESH)
+            self.adc._write_register(self.address, ADS1015_REG_POINTER_LOWTHRESH, ADS1015_RDY_LOWTHRESH)
+            self.adc._clear_ready(self.address)
+
+    def check(self, since=None):
+        """
+        Decide whether the input is inside the window.
+
+        :param since: time.monotonic() when the input last changed (e.g. a multiplexer switch); the
+            check waits for a conversion started after it, at the slowest oscillator tolerance.
+            None checks the latest conversion.
+        :return: (in_range, voltage) - voltage is None when the input is in range.
+        """
+        if since is not None:
+            delay = since + 2 * self.period * ADS1015_CONVERSION_TIME_MAX - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        if self.line is not None:
+            if self.line.get_value():
+                return True, None
+            result = self.adc._read_register(self.address, ADS1015_REG_POINTER_CONVERT)
+            return False, self.adc._to_voltage(result, self.pga, self.channel)
+
+        result = self.adc._read_register(self.address, ADS1015_REG_POINTER_CONVERT)
+        code = (result >> 4) - ((result & 0x8000) >> 3)
+        if self.low_code <= code <= self.high_code:
+            return True, None
+        return False, self.adc._to_voltage(result, self.pga, self.channel)
+
 
 class ADS1015:
     def __init__(self, i2c_bus=1):
-        self.bus = smbus.SMBus(i2c_bus)
+        self.bus = shared_bus(i2c_bus, PRIORITY_MEASUREMENT)
         self.address_1 = ADS1015_ADDRESS_1
         self.address_2 = ADS1015_ADDRESS_2
 
+        # ALERT/RDY pins wired to the Pi, used as conversion-ready signals instead of polling the OS bit
+        self.alert_lines = {}
+        self.comparator_queue = ADS1015_CONFIG_CQUE_NONE
+        if variables.ADS1015_ALERT_PINS:
+            self._initialize_alert_lines()
+
+        self.set_calibration(AdcCalibration.load())
+
+    def set_calibration(self, calibration):
+        """Applies a per-channel calibration and precomputes the code-to-volts tables for every PGA setting."""
+        self.calibration = calibration
+        # volts per 12-bit code, per PGA setting and channel, divider and gain included
+        self._volts_per_code = {
+            pga: full_scale / 2048.0 * DIVIDER_COEFFICIENT * calibration.gain
+            for pga, full_scale in ADS1015_PGA_FULL_SCALE.items()
+        }
+        self._offset = calibration.offset.copy()
+
+    def _initialize_alert_lines(self):
+        chip = open_gpio_chip(variables.ADS1015_ALERT_CHIP_NAME)
+        for address, pin in variables.ADS1015_ALERT_PINS.items():
+            line = chip.get_line(pin)
+            line.request(consumer="ads1015_rdy", type=gpio_line_request_falling_edge())
+            self._write_register(address, ADS1015_REG_POINTER_HITHRESH, ADS1015_RDY_HITHRESH)
+            self._write_register(address, ADS1015_REG_POINTER_LOWTHRESH, ADS1015_RDY_LOWTHRESH)
+            self.alert_lines[address] = line
+        self.comparator_queue = ADS1015_CONFIG_CQUE_1CONV
+
+    def _channel_address_and_mux(self, channel):
+        """Returns the chip address and its MUX setting for channel (0-7)."""
+        if 0 <= channel <= 3:
+            return self.address_1, [ADS1015_MUX_SINGLE_0, ADS1015_MUX_SINGLE_1, ADS1015_MUX_SINGLE_2, ADS1015_MUX_SINGLE_3][channel]
+        elif 4 <= channel <= 7:
+            return self.address_2, [ADS1015_MUX_SINGLE_0, ADS1015_MUX_SINGLE_1, ADS1015_MUX_SINGLE_2, ADS1015_MUX_SINGLE_3][channel - 4]
+        raise ValueError("Invalid channel number: choose from 0 to 7.")
+
+    def _clear_ready(self, address):
+        """Drop conversion-ready edges left over from earlier conversions."""
+        line = self.alert_lines.get(address)
+        if line is not None:
+            while line.event_wait(sec=0):
+                line.event_read()
+
+    def _wait_for_conversion(self, address, sps, started_at=None):
+        """Block until the conversion started on the chip (at time.monotonic() started_at) has finished."""
+        line = self.alert_lines.get(address)
+        if line is not None:
+            if not line.event_wait(sec=0, nsec=int(ADS1015_CONVERSION_TIMEOUT * 1e9)):
+                raise TimeoutError(f"No conversion-ready signal from ADS1015 0x{address:02x}")
+            line.event_read()
+            return
+
+        # Nothing to poll for before the fastest possible conversion end
+        if started_at is None:
+            started_at = time.monotonic()
+        delay = started_at + ADS1015_CONVERSION_TIME_MIN / ADS1015_DATA_RATES.get(sps, 1600) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        deadline = time.monotonic() + ADS1015_CONVERSION_TIMEOUT
+        while not self._read_register(address, ADS1015_REG_POINTER_CONFIG) & ADS1015_CONFIG_OS_IDLE:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Conversion on ADS1015 0x{address:02x} did not finish")
+
     def _write_register(self, address, reg, value):
         """Writes a 16-bit value to the specified register on the given address."""
         self.bus.write_i2c_block_data(address, reg, [(value >> 8) & 0xFF, value & 0xFF])
@@ -49,54 +235,129 @@ class ADS1015:
 
     def read_single_channel(self, channel, pga=ADS1015_PGA_2_048V, sps=ADS1015_DR_1600SPS):
         """Reads the value from one of the ADC channels (0-7) and returns it in volts, accounting for a voltage divider."""
-        # Define voltage ranges for each PGA setting
-        voltage_range = {
-            ADS1015_PGA_6_144V: 6.144,
-            ADS1015_PGA_4_096V: 4.096,
-            ADS1015_PGA_2_048V: 2.048,
-            ADS1015_PGA_1_024V: 1.024,
-            ADS1015_PGA_0_512V: 0.512,
-            ADS1015_PGA_0_256V: 0.256
-        }
-
         # Set addresses based on channel selection
-        if 0 <= channel <= 3:
-            address = self.address_1
-            mux = [ADS1015_MUX_SINGLE_0, ADS1015_MUX_SINGLE_1, ADS1015_MUX_SINGLE_2, ADS1015_MUX_SINGLE_3][channel]
-        elif 4 <= channel <= 7:
-            address = self.address_2
-            mux = [ADS1015_MUX_SINGLE_0, ADS1015_MUX_SINGLE_1, ADS1015_MUX_SINGLE_2, ADS1015_MUX_SINGLE_3][channel - 4]
-        else:
-            raise ValueError("Invalid channel number: choose from 0 to 7.")
+        address, mux = self._channel_address_and_mux(channel)
 
-        config = ADS1015_CONFIG_OS_SINGLE | mux | pga | sps | ADS1015_CONFIG_MODE_SINGLE
+        config = ADS1015_CONFIG_OS_SINGLE | mux | pga | sps | ADS1015_CONFIG_MODE_SINGLE | self.comparator_queue
 
-        # Write configuration and start conversion
-        self._write_register(address, ADS1015_REG_POINTER_CONFIG, config)
+        # Config write, conversion and result read form one sequence on the shared bus
+        with self.bus.transaction():
+            # Write configuration and start conversion
+            self._clear_ready(address)
+            self._write_register(address, ADS1015_REG_POINTER_CONFIG, config)
+
+            # Wait for conversion to complete
+            self._wait_for_conversion(address, sps)
+
+            # Read the raw result
+            result = self._read_register(address, ADS1015_REG_POINTER_CONVERT)
+        return self._to_voltage(result, pga, channel)
+
+    def read_channels(self, channels, pga=ADS1015_PGA_2_048V, sps=ADS1015_DR_1600SPS):
+        """
+        Reads any list of channels (0-7) and returns their voltages as a NumPy array in the same order.
+
+        Both chips convert at the same time: every round starts one conversion on each chip
+        back-to-back and then collects both results, so channels spread across the chips take
+        about half the time of reading them one by one.
+        """
+        channels = list(channels)
+        results = np.zeros(len(channels), dtype=np.uint16)
+
+        pending = {self.address_1: [], self.address_2: []}
+        for index, channel in enumerate(channels):
+            address, mux = self._channel_address_and_mux(channel)
+            pending[address].append((index, mux))
 
-        # Wait for conversion to complete
-        time.sleep(0.001)
+        while any(pending.values()):
+            started = []
+            with self.bus.transaction():
+                for address, queue in pending.items():
+                    if not queue:
+                        continue
+                    index, mux = queue.pop(0)
+                    config = ADS1015_CONFIG_OS_SINGLE | mux | pga | sps | ADS1015_CONFIG_MODE_SINGLE | self.comparator_queue
+                    self._clear_ready(address)
+                    self._write_register(address, ADS1015_REG_POINTER_CONFIG, config)
+                    started.append((address, index, time.monotonic()))
 
-        # Read the raw result
-        result = self._read_register(address, ADS1015_REG_POINTER_CONVERT)
-        raw_value = result >> 4  # ADS1015 returns 12-bit values, so shift right by 4 bits
+                for address, index, started_at in started:
+                    self._wait_for_conversion(address, sps, started_at)
+                    results[index] = self._read_register(address, ADS1015_REG_POINTER_CONVERT)
 
-        # Log the raw ADC result in hex format
-        # print(f"Raw ADC value (hex): {hex(raw_value)}")
+        return self.to_voltages(results, channels, pga)
 
-        # Convert the raw value to voltage
-        max_voltage = voltage_range.get(pga, 2.048)  # Default to 2.048V if PGA is unknown
-        voltage = (raw_value / 2048.0) * max_voltage  # 2048 is the midpoint for 12-bit ADC
+    def to_voltages(self, results, channels, pga=ADS1015_PGA_2_048V):
+        """
+        Converts conversion register values to calibrated volts in bulk.
 
-        # Compensation for the voltage divider (820kΩ and 120kΩ)
-        divider_coefficient = 1 + (820 / 120)  # Calculation based on the resistor values
-        real_voltage = voltage * divider_coefficient
+        :param results: Raw 16-bit conversion register values.
+        :param channels: Channel (0-7) of every value.
+        """
+        codes = np.asarray(results, dtype=np.uint16).view(np.int16) >> 4  # signed 12-bit codes
+        channels = np.asarray(channels)
+        volts_per_code = self._volts_per_code.get(pga, self._volts_per_code[ADS1015_PGA_2_048V])
+        return codes * volts_per_code[channels] + self._offset[channels]
 
-        # Log the real voltage before returning
-        # print(f"Real voltage: {real_voltage:.3f} V (compensated for voltage divider)")
+    def _to_voltage(self, result, pga, channel=0):
+        """Converts a conversion register value of the channel (0-7) to calibrated volts."""
+        code = (result >> 4) - ((result & 0x8000) >> 3)  # signed 12-bit code
+        return float(code * self._volts_per_code.get(pga, self._volts_per_code[ADS1015_PGA_2_048V])[channel]
+                     + self._offset[channel])
 
-        return real_voltage
+    def stream(self, channel, pga=ADS1015_PGA_2_048V, sps=ADS1015_DR_3300SPS, count=None):
+        """
+        Yields voltages of one channel (0-7) from continuous-conversion mode.
 
+        The config register is written once; every sample is then a single read of the conversion
+        register, paced by the conversion-ready signal or the data rate. The chip is put back into
+        single-shot (power-down) mode when the generator is closed.
+
+        :param count: Number of samples to yield, None for an endless stream.
+        """
+        address, mux = self._channel_address_and_mux(channel)
+        config = mux | pga | sps | ADS1015_CONFIG_MODE_CONTINUOUS | self.comparator_queue
+        period = 1 / ADS1015_DATA_RATES[sps]
+
+        self._clear_ready(address)
+        self._write_register(address, ADS1015_REG_POINTER_CONFIG, config)
+        line = self.alert_lines.get(address)
+        next_sample = time.monotonic() + period
+        try:
+            samples = 0
+            while count is None or samples < count:
+                if line is not None:
+                    if not line.event_wait(sec=0, nsec=int(ADS1015_CONVERSION_TIMEOUT * 1e9)):
+                        raise TimeoutError(f"No conversion-ready signal from ADS1015 0x{address:02x}")
+                    line.event_read()
+                else:
+                    delay = next_sample - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_sample = max(next_sample + period, time.monotonic())
+
+                yield self._to_voltage(self._read_register(address, ADS1015_REG_POINTER_CONVERT), pga, channel)
+                samples += 1
+        finally:
+            self._write_register(address, ADS1015_REG_POINTER_CONFIG, config | ADS1015_CONFIG_MODE_SINGLE)
+
+
+    def window_codes(self, channel, min_value, max_value, pga=ADS1015_PGA_2_048V):
+        """Returns the (low, high) signed 12-bit codes of the calibrated voltage window [min_value, max_value]."""
+        volts_per_code = self._volts_per_code.get(pga, self._volts_per_code[ADS1015_PGA_2_048V])[channel]
+        offset = self._offset[channel]
+        low = -2048 if min_value is None else int(np.ceil((min_value - offset) / volts_per_code))
+        high = 2047 if max_value is None else int(np.floor((max_value - offset) / volts_per_code))
+        return max(-2048, min(2047, low)), max(-2048, min(2047, high))
+
+    def window_comparator(self, channel, min_value=None, max_value=None, pga=ADS1015_PGA_2_048V, sps=ADS1015_DR_3300SPS):
+        """
+        Returns a WindowComparator context manager checking channel (0-7) against [min_value, max_value].
+
+        None leaves that side of the window open. The chip stays in continuous-conversion mode
+        until the context exits.
+        """
+        return WindowComparator(self, channel, min_value, max_value, pga, sps)
 
     def read_and_check_range(self, channel, min_value, max_value, pga=ADS1015_PGA_2_048V, sps=ADS1015_DR_1600SPS):
         """
@@ -131,23 +392,11 @@ class ADS1015:
         
         :return: 1 if all channels are within the range, 0 if any channel is outside the range.
         """
-        all_in_range = True  # Инициализируем общий результат как True (все в пределах диапазона)
-
-        for channel in channels:
-            try:
-                # Read the value from the selected channel
-                value = self.read_single_channel(channel, pga, sps)
-                # print(f"Read value from channel {channel}: {value}")
-                
-                # Check if the value falls within the range
-                if min_value <= value <= max_value:
-                    # print(f"Value {value} on channel {channel} is within the range {min_value}-{max_value}")
-                    pass
-                else:
-                    # print(f"Value {value} on channel {channel} is outside the range {min_value}-{max_value}")
-                    all_in_range = False  # Если хотя бы один канал не соответствует условиям, общий результат становится False
-            except Exception as e:
-                # print(f"Error reading channel {channel}: {e}")
-                all_in_range = False  # В случае ошибки чтения считаем, что канал не соответствует условиям
+        try:
+            values = self.read_channels(channels, pga, sps)
+        except Exception as e:
+            # print(f"Error reading channels {channels}: {e}")
+            return 0  # В случае ошибки чтения считаем, что каналы не соответствуют условиям
 
-        return 1 if all_in_range else 0  # Возвращаем 1 если все в пределах диапазона, иначе 0
+        # Возвращаем 1 если все в пределах диапазона, иначе 0
+        return 1 if values_in_range(values, min_value, max_value).all() else 0
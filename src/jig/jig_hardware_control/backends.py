@@ -0,0 +1,178 @@
+import os
+from pathlib import Path
+
+import variables
+
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+HARDWARE_BACKEND = "hardware"
+SIMULATION_BACKEND = "simulation"
+
+_simulated_jig = None
+
+
+def is_simulation():
+    return variables.HARDWARE_BACKEND == SIMULATION_BACKEND
+
+
+def get_simulated_jig():
+    """Returns the in-memory jig model, creating it on first use."""
+    global _simulated_jig
+    if _simulated_jig is None:
+        from .simulation import SimulatedJig
+
+        _simulated_jig = SimulatedJig()
+        # Calibration runs and loads against the model must not touch the fixture's files
+        variables.set_calibration_path(_simulated_jig.root / "calibration")
+        _simulated_jig.start()
+        logger.info(f"Simulated jig created in {_simulated_jig.root}")
+    return _simulated_jig
+
+
+def open_smbus(bus_number):
+    """Opens the I2C bus used by ADS1015, TCA9535 and I2CLCD."""
+    if is_simulation():
+        return get_simulated_jig().open_smbus(bus_number)
+
+    import smbus2
+    return smbus2.SMBus(bus_number)
+
+
+def i2c_msg_write(address, data):
+    """Builds a write message for SMBus.i2c_rdwr, sent as one I2C transaction."""
+    if is_simulation():
+        from .simulation import SimI2cMsg
+        return SimI2cMsg.write(address, data)
+
+    from smbus2 import i2c_msg
+    return i2c_msg.write(address, data)
+
+
+def open_gpio_chip(chip_name):
+    """Opens a gpiod chip (RGB led lines)."""
+    if is_simulation():
+        return get_simulated_jig().open_gpio_chip(chip_name)
+
+    import gpiod
+    return gpiod.Chip(chip_name)
+
+
+def gpio_line_request_output():
+    if is_simulation():
+        from .simulation import LINE_REQ_DIR_OUT
+        return LINE_REQ_DIR_OUT
+
+    import gpiod
+    return gpiod.LINE_REQ_DIR_OUT
+
+
+def gpio_line_request_falling_edge():
+    if is_simulation():
+        from .simulation import LINE_REQ_EV_FALLING_EDGE
+        return LINE_REQ_EV_FALLING_EDGE
+
+    import gpiod
+    return gpiod.LINE_REQ_EV_FALLING_EDGE
+
+
+def gpio_line_flag_bias_pull_up():
+    if is_simulation():
+        return 0
+
+    import gpiod
+    return gpiod.LINE_REQ_FLAG_BIAS_PULL_UP
+
+
+def open_serial(port, baudrate, timeout):
+    """Opens the DUT CDC-ACM serial port."""
+    if is_simulation():
+        return get_simulated_jig().open_serial(port, baudrate, timeout)
+
+    import serial
+    return serial.Serial(port, baudrate, timeout=timeout)
+
+
+def list_usb_serial_ports():
+    """USB CDC-ACM ports from sysfs: dicts with device, vid, pid, serial and product (None if not reported)."""
+    if is_simulation():
+        return get_simulated_jig().list_usb_serial_ports()
+
+    ports = []
+    for tty in sorted(Path("/sys/class/tty").glob("ttyACM*")):
+        # device -> the USB interface, its parent holds the device descriptor attributes
+        usb_device = (tty / "device").resolve().parent
+        attributes = {}
+        for name in ("idVendor", "idProduct", "serial", "product"):
+            try:
+                attributes[name] = (usb_device / name).read_text().strip()
+            except OSError:
+                attributes[name] = None
+        if attributes["idVendor"] is None or attributes["idProduct"] is None:
+            continue
+        ports.append({
+            "device": f"/dev/{tty.name}",
+            "vid": int(attributes["idVendor"], 16),
+            "pid": int(attributes["idProduct"], 16),
+            "serial": attributes["serial"],
+            "product": attributes["product"],
+        })
+    return ports
+
+
+def midi_get_output_names():
+    if is_simulation():
+        return get_simulated_jig().midi_get_output_names()
+
+    import mido
+    import mido.backends.rtmidi
+    return mido.get_output_names()
+
+
+def midi_open_output(name):
+    if is_simulation():
+        return get_simulated_jig().midi_open_output(name)
+
+    import mido
+    import mido.backends.rtmidi
+    return mido.open_output(name)
+
+
+def list_block_devices():
+    """Block devices from sysfs: dicts with name, vendor and model (SCSI inquiry strings, None if not reported)."""
+    if is_simulation():
+        return get_simulated_jig().list_block_devices()
+
+    devices = []
+    for block in sorted(Path("/sys/block").iterdir()):
+        attributes = {}
+        for name in ("vendor", "model"):
+            try:
+                attributes[name] = (block / "device" / name).read_text().strip()
+            except OSError:
+                attributes[name] = None
+        devices.append({"name": block.name, **attributes})
+    return devices
+
+
+def block_device_present(name):
+    if is_simulation():
+        return get_simulated_jig().block_device_present(name)
+
+    return (Path("/sys/block") / name).exists()
+
+
+def write_block_device(name, data):
+    """Writes data from the start of /dev/<name> in one write and returns once it has reached the device."""
+    if is_simulation():
+        return get_simulated_jig().write_block_device(name, data)
+
+    fd = os.open(f"/dev/{name}", os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
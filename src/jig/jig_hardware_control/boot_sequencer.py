@@ -0,0 +1,136 @@
+import json
+import time
+
+import variables
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+# Delays of the bootloader entry sequence, in order:
+# power_off - USB power off until the board has reset,
+# boot_press - BOOT relay on until its contact has closed,
+# boot_hold - USB power on until the RP2040 has sampled BOOTSEL,
+# enumeration - BOOT relay off until the UF2 drive is visible.
+BOOT_STEPS = ("power_off", "boot_press", "boot_hold", "enumeration")
+
+DEFAULT_PROFILE = "default"
+DEFAULT_BOOT_TIMING = {step: 1.0 for step in BOOT_STEPS}
+
+
+class BootTimingProfiles:
+    """
+    Named sets of boot sequence delays (seconds per step of BOOT_STEPS).
+
+    "default" is the conservative built-in; calibrate.py boot-timing saves measured profiles
+    per fixture next to it.
+    """
+
+    def __init__(self, profiles=None):
+        self.profiles = {DEFAULT_PROFILE: dict(DEFAULT_BOOT_TIMING)}
+        self.profiles.update(profiles or {})
+
+    def get(self, name=variables.BOOT_TIMING_PROFILE):
+        """Returns the delays of the profile, the default profile if there is no such one."""
+        timing = self.profiles.get(name)
+        if timing is None or any(step not in timing for step in BOOT_STEPS):
+            if name != DEFAULT_PROFILE:
+                logger.info(f"No boot timing profile {name}, using {DEFAULT_PROFILE}")
+            return dict(self.profiles[DEFAULT_PROFILE])
+        return dict(timing)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or variables.BOOT_TIMING_PATH
+        if not path.is_file():
+            return cls()
+
+        try:
+            with open(path) as f:
+                profiles = json.load(f)
+            logger.info(f"Boot timing profiles loaded from {path}")
+            return cls({name: {step: float(timing[step]) for step in BOOT_STEPS}
+                        for name, timing in profiles.items()})
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load boot timing profiles {path}: {e}")
+            return cls()
+
+    def save(self, path=None):
+        path = path or variables.BOOT_TIMING_PATH
+        with open(path, "w") as f:
+            json.dump(self.profiles, f, indent=2)
+        logger.info(f"Boot timing profiles saved to {path}")
+
+
+def run_timed_sequence(steps):
+    """
+    Runs (action, delay) steps against time.monotonic() deadlines.
+
+    Every action is due `delay` after the previous action's deadline, so time spent inside the
+    actions (I2C writes, logging) does not add up over the sequence. Returns after the last delay.
+    """
+    deadline = time.monotonic()
+    for action, delay in steps:
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        action()
+        deadline += delay
+
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def boot_into_bootloader(pins, timing):
+    """Power cycles the device on USB port 1 with BOOT held, so it comes up as the UF2 drive."""
+    run_timed_sequence([
+        (lambda: pins.usb_power_set(1, False), timing["power_off"]),
+        (lambda: pins.relay_set(2, 1), timing["boot_press"]),
+        (lambda: pins.usb_power_set(1, True), timing["boot_hold"]),
+        (lambda: pins.relay_set(2, 0), timing["enumeration"]),
+    ])
+
+
+def calibrate_boot_timing(pins, in_bootloader, trials=3, margin=1.5, resolution=0.005):
+    """
+    Finds the shortest delay of every step that still reaches the bootloader in all trials.
+
+    Steps are searched in order with the later ones at their defaults; each found minimum is
+    multiplied by margin before the next step is searched. in_bootloader() must tell whether the
+    UF2 drive is present right after the sequence. Returns (timing, minimums).
+    """
+    timing = dict(DEFAULT_BOOT_TIMING)
+    minimums = {}
+
+    def reliable(candidate):
+        for _ in range(trials):
+            # Start from a running device, so a too short power_off cannot look like a reset
+            pins.relay_set(2, 0)
+            pins.usb_power_set(1, False)
+            time.sleep(DEFAULT_BOOT_TIMING["power_off"])
+            pins.usb_power_set(1, True)
+            time.sleep(DEFAULT_BOOT_TIMING["enumeration"])
+
+            boot_into_bootloader(pins, candidate)
+            if not in_bootloader():
+                return False
+        return True
+
+    if not reliable(timing):
+        raise RuntimeError("Device does not reach the bootloader with the default timing")
+
+    for step in BOOT_STEPS:
+        low, high = 0.0, timing[step]
+        while high - low > resolution:
+            middle = (low + high) / 2
+            if reliable({**timing, step: middle}):
+                high = middle
+            else:
+                low = middle
+        minimums[step] = high
+        timing[step] = round(min(high * margin, DEFAULT_BOOT_TIMING[step]), 3)
+        logger.info(f"Boot step {step}: {high * 1000:.1f} ms minimum, {timing[step] * 1000:.1f} ms with margin")
+
+    if not reliable(timing):
+        raise RuntimeError(f"Device does not reach the bootloader with the calibrated timing {timing}")
+    return timing, minimums
@@ -0,0 +1,64 @@
+"""
+The jig drivers, each created once on first use and shared by every caller.
+
+Constructing a driver talks to the hardware (TCA9535 resets its outputs, I2CLCD replays its init
+sequence, GPIO lines are requested), so code gets drivers from here instead of constructing them.
+"""
+import threading
+import time
+
+import variables
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+_lock = threading.RLock()  # re-entrant: a driver's factory may ask for the drivers it is built on
+_devices = {}
+creation_times = {}  # name -> seconds its construction took, including drivers it created
+
+
+def _get(name, factory):
+    with _lock:
+        device = _devices.get(name)
+        if device is None:
+            started = time.perf_counter()
+            device = _devices[name] = factory()
+            creation_times[name] = time.perf_counter() - started
+            logger.info(f"Created {name} in {creation_times[name] * 1000:.1f} ms")
+        return device
+
+
+def pin_controller():
+    from .pin_controller import PinController
+    return _get("pin_controller", PinController)
+
+
+def adc():
+    from .ads1015 import ADS1015
+    return _get("adc", ADS1015)
+
+
+def multiplexer_reader():
+    from .multiplexer_reader import MultiplexerADCReader
+    return _get("multiplexer_reader", MultiplexerADCReader)
+
+
+def lcd():
+    from .I2CLCD import I2CLCD
+    return _get("lcd", lambda: I2CLCD(address=variables.SCREEN_ADDRESS, cols=variables.SCREEN_COLUMNS,
+                                      rows=variables.SCREEN_ROWS))
+
+
+def rgb_led():
+    from .rgb_led import RgbLed
+    return _get("rgb_led", RgbLed)
+
+
+def display():
+    from .Display import Display
+    return _get("display", Display)
+
+
+def serial_tests():
+    from jig.tests.serial_tests import SerialTests
+    return _get("serial_tests", SerialTests)
@@ -0,0 +1,132 @@
+import heapq
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from base_logger import get_logger_for_file
+from .backends import open_smbus
+
+logger = get_logger_for_file(__name__)
+
+# Lower number - served first when several threads wait for the bus
+PRIORITY_CRITICAL = 0  # lever and abort reads, expander writes
+PRIORITY_MEASUREMENT = 1  # ADC conversions
+PRIORITY_BULK = 2  # LCD refresh
+
+
+class PriorityLock:
+    """Re-entrant lock handed to the most urgent waiter, first come first served within a priority."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.owner = None
+        self.depth = 0
+        self.waiters = []  # heap of (priority, ticket)
+        self.tickets = itertools.count()
+
+    def acquire(self, priority):
+        me = threading.get_ident()
+        with self.condition:
+            if self.owner == me:
+                self.depth += 1
+                return
+            entry = (priority, next(self.tickets))
+            heapq.heappush(self.waiters, entry)
+            self.condition.wait_for(lambda: self.owner is None and self.waiters[0] == entry)
+            heapq.heappop(self.waiters)
+            self.owner = me
+            self.depth = 1
+
+    def release(self):
+        with self.condition:
+            self.depth -= 1
+            if self.depth == 0:
+                self.owner = None
+                self.condition.notify_all()
+
+
+class I2CBus:
+    """
+    The one SMBus handle of an I2C bus, shared by ADS1015, TCA9535 and I2CLCD.
+
+    Every call is one transaction under a priority lock; transaction() holds the bus for a
+    multi-transaction sequence. Per-device transaction and error counts are kept in
+    transactions and errors, keyed by address.
+    """
+    _instances = {}
+
+    def __new__(cls, bus_number=1):
+        if bus_number not in cls._instances:
+            instance = super().__new__(cls)
+            instance.bus_number = bus_number
+            instance.bus = open_smbus(bus_number)
+            instance.lock = PriorityLock()
+            instance.transactions = Counter()
+            instance.errors = Counter()
+            cls._instances[bus_number] = instance
+        return cls._instances[bus_number]
+
+    def client(self, priority=PRIORITY_MEASUREMENT):
+        return I2CClient(self, priority)
+
+    @contextmanager
+    def transaction(self, priority=PRIORITY_MEASUREMENT):
+        """Holds the bus for a sequence of calls from this thread."""
+        self.lock.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.lock.release()
+
+    def call(self, priority, address, method, *args, **kwargs):
+        self.lock.acquire(priority)
+        try:
+            self.transactions[address] += 1
+            return getattr(self.bus, method)(*args, **kwargs)
+        except OSError:
+            self.errors[address] += 1
+            raise
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        """{address: (transactions, errors)} since start."""
+        return {address: (count, self.errors[address]) for address, count in self.transactions.items()}
+
+
+class I2CClient:
+    """smbus2.SMBus-like view of the shared bus whose calls run with one priority."""
+
+    def __init__(self, bus, priority):
+        self.shared = bus
+        self.priority = priority
+
+    def transaction(self):
+        return self.shared.transaction(self.priority)
+
+    def write_byte(self, i2c_addr, value):
+        self.shared.call(self.priority, i2c_addr, "write_byte", i2c_addr, value)
+
+    def read_byte(self, i2c_addr):
+        return self.shared.call(self.priority, i2c_addr, "read_byte", i2c_addr)
+
+    def write_byte_data(self, i2c_addr, register, value):
+        self.shared.call(self.priority, i2c_addr, "write_byte_data", i2c_addr, register, value)
+
+    def read_byte_data(self, i2c_addr, register):
+        return self.shared.call(self.priority, i2c_addr, "read_byte_data", i2c_addr, register)
+
+    def write_i2c_block_data(self, i2c_addr, register, data):
+        self.shared.call(self.priority, i2c_addr, "write_i2c_block_data", i2c_addr, register, data)
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        return self.shared.call(self.priority, i2c_addr, "read_i2c_block_data", i2c_addr, register, length)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        self.shared.call(self.priority, i2c_msgs[0].addr, "i2c_rdwr", *i2c_msgs)
+
+
+def shared_bus(bus_number=1, priority=PRIORITY_MEASUREMENT):
+    """Returns a client of the shared bus whose calls run with the given priority."""
+    return I2CBus(bus_number).client(priority)
@@ -0,0 +1,261 @@
+import logging
+import time
+from array import array
+
+import variables
+from base_logger import get_logger_for_file
+from . import devices
+from .mux_settling import SettleProfile, settle_read
+
+logger = get_logger_for_file(__name__)
+
+SCAN_SETTLE_TIME = variables.MUX_SETTLE_FIXED_TIME
+
+
+def gray_code(bits):
+    """Channel order where neighbouring channels differ in one select pin."""
+    return tuple(i ^ (i >> 1) for i in range(1 << bits))
+
+
+class ScanResult:
+    """Voltages and time.monotonic() timestamps of a full scan, indexed by multiplexer * channels + channel."""
+
+    def __init__(self, multiplexers, channels):
+        self.channels = channels
+        self.voltages = array("d", bytes(8 * multiplexers * channels))
+        self.timestamps = array("d", bytes(8 * multiplexers * channels))
+
+    def __len__(self):
+        return len(self.voltages)
+
+    def voltage(self, multiplexer, channel):
+        return self.voltages[multiplexer * self.channels + channel]
+
+
+class MultiplexerADCReader:
+    """
+    Analog multiplexers (4051, 4052, ...) on the TCA9535 port 0 feeding one ADS1015 channel.
+
+    The wiring comes from a topology in variables.MUX_TOPOLOGIES: select_pins (LSB first),
+    enable_pins (one per multiplexer), enable_active_low and adc_channel. The output bits of every
+    (multiplexer, channel) selection are precomputed, so selecting is one lookup and one write.
+    """
+    def __init__(self, topology=None):
+        self.pin_controller = devices.pin_controller()
+        self.adc = devices.adc()
+
+        topology = variables.MUX_TOPOLOGIES[topology or variables.MUX_TOPOLOGY]
+        self.channel_controller_gpio = tuple(topology["select_pins"])
+        self.multiplexer_gpio = tuple(topology["enable_pins"])
+        self.enable_active_low = topology["enable_active_low"]
+        self.adc_channel = topology["adc_channel"]
+        self.channels = 1 << len(self.channel_controller_gpio)
+        self.settle_profile = SettleProfile.load()
+
+        self._build_select_table()
+
+        # Set up GPIO directions
+        self._initialize_gpio()
+
+    def _build_select_table(self):
+        """Precompute the select and enable pin bits of port 0 for every selection."""
+        self.select_mask = 0
+        for pin in self.channel_controller_gpio + self.multiplexer_gpio:
+            self.select_mask |= 1 << pin
+
+        disabled = 0
+        for pin in self.multiplexer_gpio:
+            disabled |= (1 if self.enable_active_low else 0) << pin
+        self.disabled_bits = disabled
+
+        self.select_table = []
+        for multiplexer, enable_pin in enumerate(self.multiplexer_gpio):
+            enabled = disabled ^ (1 << enable_pin)
+            for channel in range(self.channels):
+                value = enabled
+                for i, pin in enumerate(self.channel_controller_gpio):
+                    value |= ((channel >> i) & 1) << pin
+                self.select_table.append(value)
+
+    def _initialize_gpio(self):
+        """Initialize GPIO pins for controlling multiplexers."""
+        self.pin_controller.gpio_set_pins_direction(self.select_mask, 0)  # Set as output
+
+        # Disable all multiplexers initially
+        self._set_multiplexer(None)
+
+    def _set_multiplexer(self, multiplexer):
+        """Enable channel 0 of the multiplexer, None disables all of them."""
+        if multiplexer is None:
+            self.pin_controller.gpio_write_pins(self.select_mask, self.disabled_bits)
+        else:
+            self._select(multiplexer, 0)
+        logger.debug(f"Multiplexer set: {multiplexer}")
+
+    def _select(self, multiplexer, channel):
+        """Enable the multiplexer and set its channel with a single expander write."""
+        self.pin_controller.gpio_write_pins(self.select_mask, self.select_table[self.channel_index(multiplexer, channel)])
+        logger.debug(f"Multiplexer {multiplexer} channel {channel} selected")
+
+    def channel_index(self, multiplexer, channel):
+        if not (0 <= multiplexer < len(self.multiplexer_gpio) and 0 <= channel < self.channels):
+            raise ValueError(f"No channel {channel} on multiplexer {multiplexer}.")
+        return multiplexer * self.channels + channel
+
+    def _read_selected(self, multiplexer, channel, selected_at, settle_time=None):
+        """Convert the selected channel once the multiplexer output has settled.
+
+        With an explicit settle_time or in "fixed" mode this is a plain wait. In "adaptive" mode
+        it waits the calibrated minimum for the channel and then converts back-to-back until two
+        readings agree; if they never do, it falls back to the fixed wait and converts again.
+        """
+        if settle_time is not None or variables.MUX_SETTLE_MODE != "adaptive":
+            time.sleep(SCAN_SETTLE_TIME if settle_time is None else settle_time)
+            return self.adc.read_single_channel(self.adc_channel)
+
+        min_time, max_samples = self.settle_profile.for_channel(self.channel_index(multiplexer, channel))
+        remaining = selected_at + min_time - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+        value, samples, settled = settle_read(lambda: self.adc.read_single_channel(self.adc_channel),
+                                              self.settle_profile.tolerance, max_samples)
+        if not settled:
+            logger.warning(f"Multiplexer {multiplexer} channel {channel} did not settle in {samples} samples, "
+                           f"using the fixed wait")
+            remaining = selected_at + SCAN_SETTLE_TIME - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            value = self.adc.read_single_channel(self.adc_channel)
+        return value
+
+    def read_channel(self, multiplexer, channel):
+        """Read an analog value from a specific channel of a multiplexer.
+
+        Args:
+            multiplexer (int): The multiplexer number, by the order of enable_pins.
+            channel (int): The channel number (0-3 on a 4052, 0-7 on a 4051).
+
+        Returns:
+            float: The analog value in volts.
+        """
+        fixed = variables.MUX_SETTLE_MODE != "adaptive"
+
+        # Enable the multiplexer and set its channel
+        self._select(multiplexer, channel)
+
+        # Read from ADC channel 0
+        value = self._read_selected(multiplexer, channel, time.monotonic())
+        if fixed:
+            time.sleep(0.02)
+
+        # Disable both multiplexers after reading
+        self._set_multiplexer(None)
+        if fixed:
+            time.sleep(0.02)
+
+        return value
+
+    def scan_order(self):
+        """
+        (multiplexer, channel) pairs in scan order.
+
+        Channels follow a Gray code whose direction alternates between multiplexers, so switching
+        to the next multiplexer only touches the enable pins and every step is one expander write.
+        """
+        order = []
+        gray = gray_code(len(self.channel_controller_gpio))
+        for multiplexer in range(len(self.multiplexer_gpio)):
+            channels = gray if multiplexer % 2 == 0 else gray[::-1]
+            order.extend((multiplexer, channel) for channel in channels)
+        return order
+
+    def scan_iter(self, settle_time=None, release=False):
+        """Yield (multiplexer, channel, voltage, timestamp) for every channel of every multiplexer.
+
+        Adjacent reads switch straight from one channel to the next, without disabling all
+        multiplexers in between. All multiplexers are disabled when the scan ends or is abandoned.
+
+        Args:
+            settle_time (float): Fixed wait after switching before the conversion, in seconds.
+                None uses the configured MUX_SETTLE_MODE.
+            release (bool): Disable all multiplexers after every sample, for callers where the
+                selection itself actuates something (pads).
+        """
+        try:
+            for multiplexer, channel in self.scan_order():
+                self._select(multiplexer, channel)
+                value = self._read_selected(multiplexer, channel, time.monotonic(), settle_time)
+                timestamp = time.monotonic()
+
+                if release:
+                    self._set_multiplexer(None)
+                yield multiplexer, channel, value, timestamp
+        finally:
+            self._set_multiplexer(None)
+
+    def window_settle_time(self, multiplexer, channel, settle_time=None):
+        """
+        Wait after switching before a window check: explicit, calibrated in "adaptive" mode, or fixed.
+        A channel missing from the settle profile gets the fixed wait.
+        """
+        if settle_time is not None:
+            return settle_time
+        if variables.MUX_SETTLE_MODE == "adaptive":
+            return self.settle_profile.for_channel(self.channel_index(multiplexer, channel))[0]
+        return SCAN_SETTLE_TIME
+
+    def scan_window(self, min_value=None, max_value=None, settle_time=None):
+        """Check every channel of every multiplexer against [min_value, max_value] with the ADC window comparator.
+
+        The thresholds are programmed once for the whole scan; full values are read only for
+        channels outside the window. A channel passes only if a second, later conversion is in the
+        window too, so an input still moving after the switch cannot pass on its way through.
+
+        Returns:
+            list: (multiplexer, channel, voltage) of every channel outside the window, in scan order.
+        """
+        failures = []
+        try:
+            with self.adc.window_comparator(self.adc_channel, min_value, max_value) as window:
+                for multiplexer, channel in self.scan_order():
+                    self._select(multiplexer, channel)
+                    selected_at = time.monotonic()
+                    in_range, value = window.check(selected_at + self.window_settle_time(multiplexer, channel, settle_time))
+                    if in_range:
+                        in_range, value = window.check(time.monotonic())
+                    if not in_range:
+                        failures.append((multiplexer, channel, value))
+        finally:
+            self._set_multiplexer(None)
+        return failures
+
+    def actuate_iter(self, order=None):
+        """Yield (multiplexer, channel, selected_at) while each channel is selected, released before the next one.
+
+        For callers where the selection itself actuates something (pads): the caller's loop body
+        runs with the channel selected, selected_at is its time.monotonic().
+
+        Args:
+            order (list): (multiplexer, channel) pairs, scan_order() by default.
+        """
+        try:
+            for multiplexer, channel in order or self.scan_order():
+                self._select(multiplexer, channel)
+                yield multiplexer, channel, time.monotonic()
+                self._set_multiplexer(None)
+        finally:
+            self._set_multiplexer(None)
+
+    def scan(self, settle_time=None):
+        """Read all channels of all multiplexers.
+
+        Returns:
+            ScanResult: voltages and timestamps indexed by multiplexer * channels + channel.
+        """
+        result = ScanResult(len(self.multiplexer_gpio), self.channels)
+        for multiplexer, channel, value, timestamp in self.scan_iter(settle_time):
+            index = self.channel_index(multiplexer, channel)
+            result.voltages[index] = value
+            result.timestamps[index] = timestamp
+        return result
@@ -0,0 +1,124 @@
+import json
+import math
+import statistics
+import time
+
+import variables
+from base_logger import get_logger_for_file
+
+logger = get_logger_for_file(__name__)
+
+
+class SettleProfile:
+    """
+    Per-channel settling limits of the multiplexer output, learned by a calibration run.
+
+    Channels are keyed by their scan index (multiplexer * 4 + channel). Every entry holds
+    min_time - seconds to wait after switching before the first conversion, and
+    max_samples - the most back-to-back conversions to take while waiting for agreement.
+    """
+
+    def __init__(self, tolerance=variables.MUX_SETTLE_TOLERANCE, channels=None):
+        self.tolerance = tolerance
+        self.channels = channels or {}
+
+    def for_channel(self, index):
+        """
+        Returns (min_time, max_samples) for the channel. A channel without a calibrated entry
+        gets the fixed wait, and no channel waits less than MUX_SETTLE_MIN_TIME.
+        """
+        entry = self.channels.get(index)
+        if entry is None:
+            return variables.MUX_SETTLE_FIXED_TIME, variables.MUX_SETTLE_MAX_SAMPLES
+        return max(entry["min_time"], variables.MUX_SETTLE_MIN_TIME), entry["max_samples"]
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or variables.MUX_SETTLE_PROFILE_PATH
+        if not path.is_file():
+            logger.info(f"No mux settle profile at {path}, using defaults")
+            return cls()
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            channels = {int(index): entry for index, entry in data["channels"].items()}
+            logger.info(f"Mux settle profile loaded from {path}")
+            return cls(data["tolerance"], channels)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load mux settle profile {path}: {e}")
+            return cls()
+
+    def save(self, path=None):
+        path = path or variables.MUX_SETTLE_PROFILE_PATH
+        data = {
+            "tolerance": self.tolerance,
+            "channels": {str(index): entry for index, entry in sorted(self.channels.items())},
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+        logger.info(f"Mux settle profile saved to {path}")
+
+
+def settle_read(read, tolerance, max_samples):
+    """
+    Take back-to-back conversions until two consecutive ones agree within the tolerance.
+
+    Returns:
+        (value, samples, settled): the last reading, conversions taken and whether they agreed.
+    """
+    previous = read()
+    for samples in range(2, max(max_samples, 2) + 1):
+        value = read()
+        if abs(value - previous) <= tolerance:
+            return value, samples, True
+        previous = value
+    return previous, max(max_samples, 2), False
+
+
+def measure_settling(read, window, tolerance):
+    """
+    Sample a freshly switched channel back-to-back for `window` seconds.
+
+    Returns:
+        (settle_time, samples): seconds after which every reading stays within the tolerance
+        of the final value, and the conversions taken until then.
+    """
+    start = time.monotonic()
+    readings = []
+    while (now := time.monotonic()) - start < window:
+        readings.append((now - start, read()))
+
+    final = statistics.median(value for _, value in readings[-5:])
+    settle_time, samples = 0.0, 1
+    for number, (elapsed, value) in enumerate(readings):
+        if abs(value - final) > tolerance:
+            settle_time, samples = elapsed, number + 2
+    return settle_time, samples
+
+
+def calibrate_settle_profile(reader, window=0.05, margin=variables.MUX_SETTLE_MARGIN,
+                             tolerance=variables.MUX_SETTLE_TOLERANCE, discharge=variables.MUX_SETTLE_FIXED_TIME):
+    """
+    Measure every channel after a full-scale step: all multiplexers are disabled for `discharge`
+    seconds before the channel is selected, so the ADC input starts from 0 V whatever channel a
+    scan visits before it.
+    """
+    profile = SettleProfile(tolerance)
+    try:
+        for multiplexer, channel in reader.scan_order():
+            reader._set_multiplexer(None)
+            time.sleep(discharge)
+            reader._select(multiplexer, channel)
+            settle_time, samples = measure_settling(lambda: reader.adc.read_single_channel(reader.adc_channel),
+                                                    window, tolerance)
+            index = reader.channel_index(multiplexer, channel)
+            profile.channels[index] = {
+                "settle_time": round(settle_time, 6),
+                "min_time": round(max(settle_time * margin, variables.MUX_SETTLE_MIN_TIME), 6),
+                "max_samples": max(3, math.ceil(samples * margin)),
+            }
+            logger.info(f"Multiplexer {multiplexer} channel {channel} settles in {settle_time * 1000:.2f} ms")
+    finally:
+        reader._set_multiplexer(None)
+    return profile
@@ -1,61 +1,89 @@
-import gpiozero
-from gpiozero import Button
 import time
+
+import variables
+from .backends import open_gpio_chip, gpio_line_request_falling_edge, gpio_line_flag_bias_pull_up
 from .tca9535 import TCA9535
 
 from base_logger import get_logger_for_file
 logger = get_logger_for_file(__name__)
 
 class PinController:
-    _instance = None
     def __init__(self):
         # Initialize the TCA9535 expander
         self.tca9535 = TCA9535()
 
-        # # Define the interrupt pin (using BCM numbering, pin 4 as example for INT)
-        # self.INT_PIN = 4
-
-        # # Check if the interrupt_pin already exists and free it if needed
-        # if hasattr(self, 'interrupt_pin') and self.interrupt_pin is not None:
-        #     try:
-        #         self.interrupt_pin.close()
-        #         print(f"GPIO{self.INT_PIN} (interrupt pin) released.")
-        #     except Exception as e:
-        #         print(f"Failed to release GPIO{self.INT_PIN}: {e}")
-
-        # # Initialize the interrupt pin only if it hasn't been initialized
-        # try:
-        #     self.interrupt_pin = Button(self.INT_PIN, pull_up=True, bounce_time=0.2)  # 200 ms debounce
-        #     print("Interrupt pin initialized with debounce protection.")
-        # except gpiozero.exc.GPIOPinInUse:
-        #     print(f"GPIO{self.INT_PIN} is already in use by another process. Skipping initialization.")
-        #     self.interrupt_pin = None  # Ensure it's set to None if not initialized
-
-        # # Register the interrupt callback function for handling falling edges only if initialization succeeded
-        # if self.interrupt_pin is not None and self.interrupt_pin.when_pressed is None:
-        #     self.interrupt_pin.when_pressed = self._handle_interrupt
-
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
-    # def _handle_interrupt(self):
-    #     """
-    #     Internal method to handle the GPIO interrupt.
-    #     Called when a falling edge is detected on the INT_PIN.
-    #     """
-    #     print(f"Interrupt detected on GPIO {self.INT_PIN}")
-
-    #     # Call the user's custom interrupt handler if set
-    #     if self.user_interrupt_handler:
-    #         self.user_interrupt_handler()
-
-    # def set_interrupt_handler(self, handler):
-    #     """
-    #     Allows the user to set a custom interrupt handler.
-    #     """
-    #     self.user_interrupt_handler = handler
+        # TCA9535 INT: falls when an input pin changes, released by reading the input registers
+        self.interrupt_line = None
+        if variables.TCA9535_INT_PIN is not None:
+            self._initialize_interrupt_line()
+
+    def _initialize_interrupt_line(self):
+        try:
+            chip = open_gpio_chip(variables.TCA9535_INT_CHIP_NAME)
+            line = chip.get_line(variables.TCA9535_INT_PIN)
+            line.request(consumer="tca9535_int", type=gpio_line_request_falling_edge(),
+                         flags=gpio_line_flag_bias_pull_up())
+        except OSError as e:
+            logger.warning(f"GPIO{variables.TCA9535_INT_PIN} (interrupt pin) is not available, polling inputs: {e}")
+            return
+        self.interrupt_line = line
+        logger.info("Interrupt pin initialized.")
+
+    def __clear_input_edges(self):
+        if self.interrupt_line is not None:
+            while self.interrupt_line.event_wait(sec=0):
+                self.interrupt_line.event_read()
+
+    def __wait_input_edge(self, timeout):
+        """Blocks until the INT line falls or the timeout passes. Polling fallback: sleeps one interval."""
+        if self.interrupt_line is None:
+            time.sleep(max(0.0, min(timeout, variables.INPUT_POLL_INTERVAL)))
+            return True
+
+        timeout = max(0.0, timeout)
+        if self.interrupt_line.event_wait(sec=int(timeout), nsec=int(timeout % 1 * 1e9)):
+            self.interrupt_line.event_read()
+            return True
+        return False
+
+    def input_edge_pending(self):
+        """
+        Whether an input pin may have changed since the last wait_for_pin, without touching the bus.
+        Always True without the INT line.
+        """
+        return self.interrupt_line is None or bool(self.interrupt_line.event_wait(sec=0))
+
+    def wait_for_pin(self, pin, value, timeout=None, debounce=variables.INPUT_DEBOUNCE_TIME):
+        """
+        Blocks until input pin (0-7) of port 0 reads value and keeps it for the debounce time.
+
+        The expander is read only when its INT line signals a change; with INT the level has to
+        hold with no further edges, without it the pin is read again after the debounce time.
+
+        Returns:
+            True - the pin has the value, False - the timeout passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.__clear_input_edges()
+            if self.gpio_read_pin(pin) == value:  # also releases INT
+                if self.interrupt_line is not None:
+                    if not self.__wait_input_edge(debounce):
+                        return True
+                else:
+                    time.sleep(debounce)
+                    if self.gpio_read_pin(pin) == value:
+                        return True
+                continue
+
+            if deadline is None:
+                # Re-read now and then, a missed edge must not block forever
+                self.__wait_input_edge(1.0)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.__wait_input_edge(remaining)
 
     def gpio_set_pin_direction(self, pin, direction):
         """
@@ -64,12 +92,16 @@ class PinController:
         pin: Pin number (0-7).
         direction: Direction (1 - input, 0 - output).
         """
-        current_config = self.tca9535.read_register(0x06)  # Configuration register for port 0
-        if direction:
-            current_config |= (1 << pin)  # Set bit for input
-        else:
-            current_config &= ~(1 << pin)  # Clear bit for output
-        self.tca9535.write_register(0x06, current_config)
+        self.gpio_set_pins_direction(1 << pin, 0xFF if direction else 0x00)
+
+    def gpio_set_pins_direction(self, mask, direction_byte):
+        """
+        Sets the direction for several pins on port 0 with a single write.
+
+        mask: Byte where each set bit selects a pin to change.
+        direction_byte: Directions for the selected pins (1 - input, 0 - output).
+        """
+        self.tca9535.update_config(mask & 0xFF, direction_byte & 0xFF)
 
     def gpio_write_pin(self, pin, value):
         """
@@ -80,13 +112,22 @@ class PinController:
         """
         self.tca9535.set_pin(0, pin, value)
 
+    def gpio_write_pins(self, mask, value_byte):
+        """
+        Writes several pins on port 0 with a single write.
+
+        mask: Byte where each set bit selects a pin to change.
+        value_byte: States for the selected pins (1 - high, 0 - low).
+        """
+        self.tca9535.update_outputs(mask & 0xFF, value_byte & 0xFF)
+
     def gpio_read_pin(self, pin):
         """
         Reads the state of a specific pin on port 0.
         
         pin: Pin number (0-7).
         """
-        current_state = self.tca9535.read_register(0x00)  # Input register for port 0
+        current_state = self.tca9535.read_inputs()  # Input registers of both ports
         return (current_state >> pin) & 1
 
     def gpio_set_port_direction(self, direction_byte):
@@ -95,7 +136,7 @@ class PinController:
         
         direction_byte: Byte where each bit represents the direction for a pin (1 - input, 0 - output).
         """
-        self.tca9535.write_register(0x06, direction_byte)
+        self.tca9535.update_config(0xFF, direction_byte)
 
     def gpio_write_port(self, value_byte):
         """
@@ -103,7 +144,7 @@ class PinController:
         
         value_byte: Byte to write, where each bit represents the state of a pin (1 - high, 0 - low).
         """
-        self.tca9535.write_register(0x02, value_byte)
+        self.tca9535.update_outputs(0xFF, value_byte)
 
     def gpio_read_port(self):
         """
@@ -111,7 +152,7 @@ class PinController:
         
         Returns a byte where each bit represents the state of a pin.
         """
-        return self.tca9535.read_register(0x00)
+        return self.tca9535.read_inputs() & 0xFF
 
     # Relay control using TCA9535
     def relay_set(self, relay_number, state, delay=0):
@@ -171,12 +212,13 @@ class PinController:
             self.relay_set(i, 0)  # Set all relays OFF
             self.usb_power_set(i, 1)  # Set all USB ports ON
 
-        # Close the Button object to free GPIO4 if it exists
-        if hasattr(self, 'interrupt_pin') and self.interrupt_pin is not None:
+        # Release the interrupt line if it was requested
+        if self.interrupt_line is not None:
             try:
-                self.interrupt_pin.close()
-                logger.debug(f"GPIO{self.INT_PIN} (interrupt pin) released.")
+                self.interrupt_line.release()
+                self.interrupt_line = None
+                logger.debug(f"GPIO{variables.TCA9535_INT_PIN} (interrupt pin) released.")
             except Exception as e:
-                logger.debug(f"Failed to release GPIO{self.INT_PIN}: {e}")
+                logger.debug(f"Failed to release GPIO{variables.TCA9535_INT_PIN}: {e}")
 
         logger.debug("GPIO resources cleaned up.")
\ No newline at end of file
@@ -1,7 +1,8 @@
-import gpiod
 import enum
 import variables
 
+from .backends import open_gpio_chip, gpio_line_request_output
+
 class RgbColorsEnum(enum.Enum):
     NONE = (0, 0, 0)
     RED = (1, 0, 0)
@@ -13,17 +14,10 @@ class RgbColorsEnum(enum.Enum):
     WHITE = (1, 1, 1)
 
 class RgbLed:
-    _instance = None
-
     def __init__(self):
-        self.chip = gpiod.Chip(variables.RGB_LED_CHIP_NAME)
+        self.chip = open_gpio_chip(variables.RGB_LED_CHIP_NAME)
         self.lines = self.chip.get_lines([variables.RGB_LED_RED_PIN, variables.RGB_LED_GREEN_PIN, variables.RGB_LED_BLUE_PIN])
-        self.lines.request(consumer="rgb_control", type=gpiod.LINE_REQ_DIR_OUT)
-
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+        self.lines.request(consumer="rgb_control", type=gpio_line_request_output())
 
     def set_color(self, color):
         if type(color) is RgbColorsEnum:
@@ -0,0 +1,823 @@
+"""
+In-memory model of the jig and the device under test.
+
+Selected with JIG_HARDWARE_BACKEND=simulation. The model is wired the same way as the
+real fixture: the TCA9535 drives the 4052 multiplexers, the lever, the USB power switch
+and the BOOT relay, the ADS1015 converts the multiplexer output, the HD44780 sits behind
+a PCF8574 backpack, and the simulated Playtron reacts to power, UF2 blocks written to its
+bootloader drive, sysex and pads.
+All timing is real (time.monotonic), so cycle time measured here is comparable between
+changes.
+"""
+import bisect
+import errno
+import json
+import math
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
+from pathlib import Path
+
+# gpiod v1 request and event types
+LINE_REQ_DIR_IN = 2
+LINE_REQ_DIR_OUT = 3
+LINE_REQ_EV_FALLING_EDGE = 4
+FALLING_EDGE = 2
+
+DIVIDER_COEFFICIENT = 1 + (820 / 120)
+
+TCA9535_ADDRESS = 0x20
+ADS1015_ADDRESSES = (0x48, 0x4B)
+ADS1015_ALERT_LINES = {0x48: 22, 0x4B: 23}  # gpiochip0 lines wired to ALERT/RDY
+TCA9535_INT_LINE = 4  # gpiochip0 line wired to the expander INT
+LCD_ADDRESS = 0x27
+
+LEVER_PIN = 0
+MUX_CHANNEL_PINS = (1, 2)
+MUX_ENABLE_PINS = (3, 4, 5, 6)
+BOOT_RELAY_PIN = 1  # relay 2, port 1
+USB_POWER_PIN = 4  # usb port 1, port 1
+RELAY_OPERATE_TIME = 0.01  # coil energized -> contact closed
+RELAY_RELEASE_TIME = 0.005
+
+ADS1015_DATA_RATES = (128, 250, 490, 920, 1600, 2400, 3300, 3300)
+ADS1015_FULL_SCALE = (6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256)
+
+I2C_M_RD = 0x0001
+
+LCD_EN = 0b00000100
+LCD_RS = 0b00000001
+
+SYSEX_TEST_MODE = [240, 11, 20, 13, 0, 247]
+SYSEX_ENABLE_LOGS = [240, 11, 20, 13, 2, 247]
+
+MIDI_PORT_NAME = "Playtron:Playtron MIDI 1 24:0"
+SERIAL_PORT_NAME = "/dev/ttyACM0"
+USB_VID = 0x2E8A
+USB_PID = 0x10C8
+BLOCK_DEVICE_NAME = "sda"
+UF2_DRIVE_VENDOR = "RPI"  # SCSI inquiry strings of the RP2040 bootloader drive
+UF2_DRIVE_MODEL = "RP2"
+USB_WRITE_RATE = 1_000_000  # bytes/s reaching the bootloader over full speed USB
+FLASH_PROGRAM_TIME = 0.0005  # per 256 byte UF2 payload
+UF2_MAGIC = (0x0A324655, 0x9E5D5157, 0x0AB16F30)
+
+
+class SimTCA9535:
+    def __init__(self, jig):
+        self.jig = jig
+        # input 0/1, output 0/1, polarity 0/1, config 0/1 (power-on defaults)
+        self.registers = [0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0x00, 0xFF, 0xFF]
+        self.pointer = 0
+        self.last_read = [0xFF, 0xFF]  # input ports as last read, INT compares against them
+
+    def write(self, data):
+        self.pointer = data[0] & 0x07
+        for value in data[1:]:
+            if self.pointer >= 2:
+                self.registers[self.pointer] = value & 0xFF
+            self.pointer ^= 1  # auto-increment inside the register pair
+        if len(data) > 1:
+            self.jig.on_expander_changed()
+
+    def read(self, length):
+        result = []
+        for _ in range(length):
+            value = self.register_value(self.pointer)
+            if self.pointer < 2:
+                self.last_read[self.pointer] = value  # reading the input port releases INT
+            result.append(value)
+            self.pointer ^= 1
+        return result
+
+    def int_level(self):
+        """INT is low while an input pin differs from what the input port last read."""
+        for port in (0, 1):
+            if (self.input_port(port) ^ self.last_read[port]) & self.registers[6 + port]:
+                return 0
+        return 1
+
+    def register_value(self, register):
+        if register < 2:
+            return self.input_port(register)
+        return self.registers[register]
+
+    def port_levels(self, port):
+        config = self.registers[6 + port]
+        return ((self.registers[2 + port] & ~config) | (self.jig.external_input(port) & config)) & 0xFF
+
+    def input_port(self, port):
+        return self.port_levels(port) ^ self.registers[4 + port]
+
+    def pin_level(self, port, pin):
+        return (self.port_levels(port) >> pin) & 1
+
+
+class SimADS1015:
+    def __init__(self, jig, address):
+        self.jig = jig
+        self.address = address
+        self.registers = [0x0000, 0x8583, 0x8000, 0x7FF0]
+        self.pointer = 0
+        self.started_at = 0.0
+        self.done_at = 0.0
+        self.pending = False
+
+    @property
+    def config(self):
+        return self.registers[1]
+
+    def conversion_time(self):
+        return 1 / ADS1015_DATA_RATES[(self.config >> 5) & 0x07] + 25e-6
+
+    def is_continuous(self):
+        return not self.config & 0x0100
+
+    def write(self, data):
+        self.pointer = data[0] & 0x03
+        if len(data) < 3:
+            return
+        value = (data[1] << 8) | data[2]
+        if self.pointer == 1:
+            self.write_config(value)
+        elif self.pointer in (2, 3):
+            self.registers[self.pointer] = value
+
+    def write_config(self, value):
+        now = time.monotonic()
+        self.update(now)
+        self.registers[1] = value & 0x7FFF
+        if self.is_continuous() or value & 0x8000:
+            self.started_at = now
+            self.done_at = now + self.conversion_time()
+            self.pending = True
+
+    def update(self, now):
+        if not self.pending or now < self.done_at:
+            return
+        if self.is_continuous():
+            period = self.conversion_time()
+            latest = self.started_at + period * math.floor((now - self.started_at) / period)
+            self.registers[0] = self.sample(latest)
+            return
+        self.registers[0] = self.sample(self.done_at)
+        self.pending = False
+
+    def sample(self, at):
+        mux = (self.config >> 12) & 0x07
+        channel = mux - 4 if mux >= 4 else 0
+        full_scale = ADS1015_FULL_SCALE[(self.config >> 9) & 0x07]
+        voltage = self.jig.adc_input(self.address, channel, at)
+        code = max(-2048, min(2047, round(voltage / full_scale * 2048)))
+        return (code & 0xFFF) << 4
+
+    def is_ready_mode(self):
+        """ALERT/RDY works as conversion-ready: Hi_thresh MSB set, Lo_thresh MSB clear."""
+        return (self.config & 0x0003) != 0x0003 and self.registers[3] & 0x8000 and not self.registers[2] & 0x8000
+
+    def completed_conversions(self, at):
+        if self.started_at == 0.0 or at < self.done_at:
+            return 0
+        if not self.is_continuous():
+            return 1
+        return math.floor((at - self.started_at) / self.conversion_time())
+
+    def comparator_asserted(self, now):
+        """Non-latching comparator state for the latest conversion (traditional or window mode)."""
+        if (self.config & 0x0003) == 0x0003 or not self.completed_conversions(now):
+            return False
+        self.update(now)
+        signed = lambda value: value - 0x10000 if value & 0x8000 else value
+        code, low, high = (signed(value) for value in self.registers[:1] + self.registers[2:])
+        if self.config & 0x0010:
+            return code > high or code < low
+        return code > high
+
+    def alert_level(self, now):
+        if self.is_ready_mode():
+            asserted = not self.is_continuous() and self.completed_conversions(now)
+        else:
+            asserted = self.comparator_asserted(now)
+        active_high = bool(self.config & 0x0008)
+        return int(bool(asserted) == active_high)
+
+    def alert_falling_edge(self, since, until):
+        if not self.is_ready_mode():
+            return False
+        return self.completed_conversions(until) > self.completed_conversions(since)
+
+    def read(self, length):
+        now = time.monotonic()
+        self.update(now)
+        value = self.registers[self.pointer]
+        if self.pointer == 1 and not (self.pending and now < self.done_at and not self.is_continuous()):
+            value |= 0x8000  # OS bit: no conversion in progress
+        return [(value >> 8) & 0xFF, value & 0xFF][:length]
+
+
+class SimHD44780:
+    """HD44780 in 4-bit mode behind a PCF8574 backpack."""
+
+    def __init__(self):
+        self.ddram = bytearray(b" " * 0x80)
+        self.address = 0
+        self.last = 0
+        self.pending_nibble = None
+
+    def write(self, data):
+        for value in data:
+            if self.last & LCD_EN and not value & LCD_EN:
+                self.latch(self.last)
+            self.last = value
+
+    def read(self, length):
+        return [self.last] * length
+
+    def latch(self, value):
+        if self.pending_nibble is None:
+            self.pending_nibble = value & 0xF0
+            return
+        byte = self.pending_nibble | (value >> 4)
+        self.pending_nibble = None
+        if value & LCD_RS:
+            self.ddram[self.address] = byte
+            self.address = (self.address + 1) & 0x7F
+        else:
+            self.command(byte)
+
+    def command(self, cmd):
+        if cmd & 0x80:
+            self.address = cmd & 0x7F
+        elif cmd == 0x01:
+            self.ddram[:] = b" " * 0x80
+            self.address = 0
+        elif cmd & 0xFE == 0x02:
+            self.address = 0
+
+    def rows(self):
+        return [self.ddram[0x00:0x10].decode("ascii", "replace"),
+                self.ddram[0x40:0x50].decode("ascii", "replace")]
+
+
+class SimPlaytron:
+    OFF = "off"
+    DISCHARGING = "discharging"  # power removed, not yet low enough to reset
+    RESET = "reset"  # powered, BOOTSEL not sampled yet
+    BOOTLOADER_ENUMERATING = "bootloader enumerating"
+    BOOTLOADER = "bootloader"
+    BOOTING = "booting"
+    APP = "app"
+
+    def __init__(self, jig, rng):
+        self.jig = jig
+        self.state = self.OFF
+        self.state_changed_at = time.monotonic()
+        self.discharge_time = rng.uniform(0.15, 0.3)
+        self.bootsel_sample_time = 0.002
+        self.resume_state = self.OFF
+        self.bootloader_enumeration_time = 0.4
+        self.app_boot_time = rng.uniform(1.2, 2.0)
+        self.led_voltages = [rng.uniform(2.0, 2.6) for _ in range(16)]
+        # how long a pad has to be touched before the firmware reports it
+        self.pad_latency = [rng.uniform(0.005, 0.015) for _ in range(16)]
+        self.test_mode = False
+        self.logs_enabled = False
+        self.flashed_bytes = 0
+        self.uf2_blocks = set()  # block numbers of the image received so far
+        self.image_programmed_at = None
+        self.serial_number = f"E660{rng.getrandbits(48):012X}"
+        self.touched_pad = None
+        self.touched_at = 0.0
+        self.touch_reported = False
+
+    def set_state(self, state, now):
+        self.state = state
+        self.state_changed_at = now
+        if state == self.BOOTLOADER_ENUMERATING:
+            self.uf2_blocks.clear()
+            self.image_programmed_at = None
+        if state != self.APP:
+            self.test_mode = False
+            self.logs_enabled = False
+
+    def update(self, now, present, powered, boot_pressed):
+        elapsed = now - self.state_changed_at
+        if not present:
+            if self.state != self.OFF:
+                self.set_state(self.OFF, now)
+            return
+        if not powered:
+            if self.state not in (self.OFF, self.DISCHARGING):
+                self.resume_state = self.state
+                self.state = self.DISCHARGING
+                self.state_changed_at = now
+            elif self.state == self.DISCHARGING and elapsed >= self.discharge_time:
+                self.set_state(self.OFF, now)
+            return
+
+        if self.state == self.DISCHARGING:
+            # Power came back before the supply dropped low enough: no reset
+            self.state = self.resume_state
+        elif self.state == self.OFF:
+            self.set_state(self.RESET, now)
+        elif self.state == self.RESET and elapsed >= self.bootsel_sample_time:
+            self.set_state(self.BOOTLOADER_ENUMERATING if boot_pressed else self.BOOTING, now)
+        elif self.state == self.BOOTLOADER_ENUMERATING and elapsed >= self.bootloader_enumeration_time:
+            self.set_state(self.BOOTLOADER, now)
+        elif (self.state == self.BOOTLOADER and self.image_programmed_at is not None
+              and now >= self.image_programmed_at):
+            self.set_state(self.BOOTING, now)
+        elif self.state == self.BOOTING and elapsed >= self.app_boot_time:
+            self.set_state(self.APP, now)
+
+        if (self.touched_pad is not None and not self.touch_reported
+                and now - self.touched_at >= self.pad_latency[self.touched_pad]):
+            self.touch_reported = True
+            if self.state == self.APP and self.logs_enabled:
+                self.jig.serial_output(json.dumps({"status": "pressed", "pad_id": self.touched_pad}))
+
+    def receive_sectors(self, data, now):
+        """Like the bootrom: any written sector holding a UF2 block is programmed, the rest is ignored."""
+        total = None
+        for start in range(0, len(data) - 511, 512):
+            magic_start0, magic_start1, _, _, payload_size, block_no, num_blocks = \
+                struct.unpack_from("<7I", data, start)
+            magic_end, = struct.unpack_from("<I", data, start + 508)
+            if (magic_start0, magic_start1, magic_end) != UF2_MAGIC or block_no >= num_blocks:
+                continue
+            self.uf2_blocks.add(block_no)
+            self.flashed_bytes += payload_size
+            total = num_blocks
+
+        # The bootrom reboots into the new image once every block of it has been programmed
+        if total is not None and len(self.uf2_blocks) >= total and self.image_programmed_at is None:
+            self.image_programmed_at = now + total * FLASH_PROGRAM_TIME
+
+    def led_voltage(self, index):
+        if self.state == self.APP and self.test_mode:
+            return self.led_voltages[index]
+        return 3.3
+
+    def on_pad_selected(self, index, now):
+        self.touched_pad = index
+        self.touched_at = now
+        self.touch_reported = False
+
+    def handle_midi(self, data):
+        if data == SYSEX_TEST_MODE:
+            self.test_mode = True
+        elif data == SYSEX_ENABLE_LOGS:
+            self.logs_enabled = True
+
+
+class SimulatedSMBus:
+    """smbus2.SMBus look-alike; every call is one I2C transaction."""
+
+    def __init__(self, jig, bus_number):
+        self.jig = jig
+        self.bus_number = bus_number
+
+    def _device(self, address):
+        self.jig.count_transaction(address)
+        device = self.jig.i2c_devices.get(address)
+        if device is None:
+            raise OSError(errno.EREMOTEIO, f"No device at 0x{address:02x}")
+        return device
+
+    def write_byte(self, i2c_addr, value, force=None):
+        with self.jig.lock:
+            self._device(i2c_addr).write([value])
+
+    def read_byte(self, i2c_addr, force=None):
+        with self.jig.lock:
+            return self._device(i2c_addr).read(1)[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        with self.jig.lock:
+            self._device(i2c_addr).write([register, value])
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        with self.jig.lock:
+            device = self._device(i2c_addr)
+            device.write([register])
+            return device.read(1)[0]
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        with self.jig.lock:
+            self._device(i2c_addr).write([register] + list(data))
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        with self.jig.lock:
+            device = self._device(i2c_addr)
+            device.write([register])
+            return device.read(length)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        """Combined transaction: one count per call, whatever the number of messages."""
+        with self.jig.lock:
+            for number, msg in enumerate(i2c_msgs):
+                if number == 0:
+                    device = self._device(msg.addr)
+                else:
+                    device = self.jig.i2c_devices[msg.addr]
+                if msg.flags & I2C_M_RD:
+                    msg.buf = bytes(device.read(msg.len))
+                else:
+                    device.write(list(msg.buf))
+
+    def close(self):
+        pass
+
+
+class SimI2cMsg:
+    """smbus2.i2c_msg look-alike."""
+
+    def __init__(self, addr, flags, buf):
+        self.addr = addr
+        self.flags = flags
+        self.buf = buf
+        self.len = len(buf)
+
+    @classmethod
+    def write(cls, address, buf):
+        return cls(address, 0, bytes(buf))
+
+    @classmethod
+    def read(cls, address, length):
+        return cls(address, I2C_M_RD, bytes(length))
+
+
+class SimLineEvent:
+    def __init__(self, type, timestamp):
+        self.type = type
+        self.sec = int(timestamp)
+        self.nsec = int((timestamp - self.sec) * 1e9)
+
+
+class SimGpioLine:
+    def __init__(self, jig, offset):
+        self.jig = jig
+        self.offset = offset
+        self.events_since = time.monotonic()
+
+    def request(self, consumer, type=LINE_REQ_DIR_IN, flags=0, default_val=0):
+        if type == LINE_REQ_DIR_OUT:
+            self.set_value(default_val)
+        self.events_since = time.monotonic()
+
+    def set_value(self, value):
+        self.jig.gpio_levels[self.offset] = value
+
+    def get_value(self):
+        return self.jig.gpio_level(self.offset)
+
+    def event_wait(self, sec=0, nsec=0):
+        deadline = time.monotonic() + sec + nsec / 1e9
+        while True:
+            now = time.monotonic()
+            if self.jig.gpio_falling_edge(self.offset, self.events_since, now):
+                return True
+            if now >= deadline:
+                return False
+            time.sleep(0.0001)
+
+    def event_read(self):
+        now = time.monotonic()
+        self.events_since = now
+        return SimLineEvent(FALLING_EDGE, now)
+
+    def release(self):
+        pass
+
+
+class SimGpioLineBulk:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def request(self, consumer, type=LINE_REQ_DIR_IN, default_vals=None):
+        for line, value in zip(self.lines, default_vals or [0] * len(self.lines)):
+            line.request(consumer, type, default_val=value)
+
+    def set_values(self, values):
+        for line, value in zip(self.lines, values):
+            line.set_value(value)
+
+    def get_values(self):
+        return [line.get_value() for line in self.lines]
+
+    def release(self):
+        pass
+
+
+class SimGpioChip:
+    def __init__(self, jig, name):
+        self.jig = jig
+        self.name = name
+
+    def get_line(self, offset):
+        return SimGpioLine(self.jig, offset)
+
+    def get_lines(self, offsets):
+        return SimGpioLineBulk([SimGpioLine(self.jig, offset) for offset in offsets])
+
+    def close(self):
+        pass
+
+
+class SimSerial:
+    """pyserial.Serial look-alike for the DUT CDC-ACM port."""
+
+    def __init__(self, jig, port, baudrate, timeout):
+        self.jig = jig
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        with self.jig.serial_condition:
+            return len(self.buffer)
+
+    def feed(self, data):
+        self.buffer += data
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.jig.serial_condition:
+            while len(self.buffer) < size and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.jig.serial_condition.wait(remaining)
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+    def readline(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.jig.serial_condition:
+            while b"\n" not in self.buffer and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.jig.serial_condition.wait(remaining)
+            end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+            data = bytes(self.buffer[:end])
+            del self.buffer[:end]
+            return data
+
+    def close(self):
+        with self.jig.serial_condition:
+            self.is_open = False
+            if self in self.jig.open_serials:
+                self.jig.open_serials.remove(self)
+            self.jig.serial_condition.notify_all()
+
+
+class SimMidiOutput:
+    def __init__(self, jig, name):
+        self.jig = jig
+        self.name = name
+        self.closed = False
+
+    def send(self, message):
+        with self.jig.lock:
+            self.jig.midi_messages.append(message.bytes())
+            self.jig.dut.handle_midi(message.bytes())
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedJig:
+    def __init__(self, seed=0):
+        self.lock = threading.RLock()
+        self.serial_condition = threading.Condition(self.lock)
+        self.random = random.Random(seed)
+
+        self.root = Path(tempfile.mkdtemp(prefix="jig-sim-"))
+
+        self.expander = SimTCA9535(self)
+        self.lcd = SimHD44780()
+        self.i2c_devices = {TCA9535_ADDRESS: self.expander, LCD_ADDRESS: self.lcd}
+        for address in ADS1015_ADDRESSES:
+            self.i2c_devices[address] = SimADS1015(self, address)
+
+        self.transactions = Counter()
+        self.transaction_times = array("d")
+        self.transaction_addresses = array("B")
+        self.gpio_levels = {}
+        self.open_serials = []
+        self.midi_messages = []
+
+        self.relay_energized = False
+        self.relay_changed_at = 0.0
+        self.lever_closed = False
+        self.int_edges = array("d")  # falling edges of the expander INT
+        self.dut = SimPlaytron(self, self.random)
+
+        # RC settling of the multiplexer output, per (mux, channel)
+        self.settle_tau = [self.random.uniform(0.0005, 0.003) for _ in range(16)]
+        self.selected_mux = None
+        self.mux_changed_at = 0.0
+        self.mux_voltage_at_change = 0.0
+
+        self._ticker = None
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._ticker = threading.Thread(target=self.__tick, daemon=True)
+        self._ticker.start()
+
+    def stop(self):
+        self._running = False
+        if self._ticker:
+            self._ticker.join()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __tick(self):
+        while self._running:
+            self.update()
+            time.sleep(0.001)
+
+    def update(self):
+        with self.lock:
+            now = time.monotonic()
+            self.dut.update(now, self.lever_closed,
+                            self.expander.pin_level(1, USB_POWER_PIN) == 0,
+                            self.boot_contact_closed(now))
+
+    def boot_contact_closed(self, now):
+        if self.relay_energized:
+            return now - self.relay_changed_at >= RELAY_OPERATE_TIME
+        return now - self.relay_changed_at < RELAY_RELEASE_TIME
+
+    # Operator actions
+    def connect_device(self):
+        with self.lock:
+            self.dut = SimPlaytron(self, self.random)
+            self.set_lever(True)
+
+    def disconnect_device(self):
+        with self.lock:
+            self.set_lever(False)
+            self.update()
+
+    def set_lever(self, closed):
+        int_was_high = self.expander.int_level()
+        self.lever_closed = closed
+        if int_was_high and not self.expander.int_level():
+            self.int_edges.append(time.monotonic())
+
+    # Wiring
+    def external_input(self, port):
+        if port == 0 and self.lever_closed:
+            return 0xFF & ~(1 << LEVER_PIN)
+        return 0xFF
+
+    def mux_selection(self):
+        enabled = [mux for mux, pin in enumerate(MUX_ENABLE_PINS) if not self.expander.pin_level(0, pin)]
+        if len(enabled) != 1:
+            return None
+        channel = 0
+        for bit, pin in enumerate(MUX_CHANNEL_PINS):
+            channel |= self.expander.pin_level(0, pin) << bit
+        return enabled[0] * len(MUX_CHANNEL_PINS) ** 2 + channel
+
+    def mux_voltage(self, at):
+        if self.selected_mux is None:
+            target = 0.0
+        else:
+            target = self.dut.led_voltage(self.selected_mux) / DIVIDER_COEFFICIENT
+        tau = self.settle_tau[self.selected_mux] if self.selected_mux is not None else 0.001
+        elapsed = max(0.0, at - self.mux_changed_at)
+        return target + (self.mux_voltage_at_change - target) * math.exp(-elapsed / tau)
+
+    def on_expander_changed(self):
+        now = time.monotonic()
+        selection = self.mux_selection()
+        if selection != self.selected_mux:
+            self.mux_voltage_at_change = self.mux_voltage(now)
+            self.selected_mux = selection
+            self.mux_changed_at = now
+            self.dut.on_pad_selected(selection, now)
+        energized = self.expander.pin_level(1, BOOT_RELAY_PIN) == 0
+        if energized != self.relay_energized:
+            self.relay_energized = energized
+            self.relay_changed_at = now
+        self.update()
+
+    def adc_input(self, address, channel, at):
+        if address == ADS1015_ADDRESSES[0] and channel == 0:
+            voltage = self.mux_voltage(at)
+        else:
+            voltage = 0.0
+        return voltage + self.random.gauss(0, 0.0005)
+
+    def gpio_level(self, offset):
+        with self.lock:
+            for address, line in ADS1015_ALERT_LINES.items():
+                if line == offset:
+                    return self.i2c_devices[address].alert_level(time.monotonic())
+            if offset == TCA9535_INT_LINE:
+                return self.expander.int_level()
+            return self.gpio_levels.get(offset, 1)
+
+    def gpio_falling_edge(self, offset, since, until):
+        with self.lock:
+            for address, line in ADS1015_ALERT_LINES.items():
+                if line == offset:
+                    return self.i2c_devices[address].alert_falling_edge(since, until)
+            if offset == TCA9535_INT_LINE:
+                index = bisect.bisect_right(self.int_edges, since)
+                return index < len(self.int_edges) and self.int_edges[index] <= until
+            return False
+
+    def count_transaction(self, address):
+        self.transactions[address] += 1
+        self.transaction_times.append(time.monotonic())
+        self.transaction_addresses.append(address)
+
+    def transactions_between(self, start, end):
+        """Counts I2C transactions per address in [start, end)."""
+        first = bisect.bisect_left(self.transaction_times, start)
+        last = bisect.bisect_left(self.transaction_times, end)
+        return Counter(self.transaction_addresses[first:last])
+
+    def clear_transaction_log(self):
+        with self.lock:
+            del self.transaction_times[:]
+            del self.transaction_addresses[:]
+
+    def serial_output(self, line):
+        with self.serial_condition:
+            for port in self.open_serials:
+                port.feed(line.encode("ascii") + b"\r\n")
+            self.serial_condition.notify_all()
+
+    def screen_text(self):
+        with self.lock:
+            return self.lcd.rows()
+
+    # Backend factories
+    def open_smbus(self, bus_number):
+        return SimulatedSMBus(self, bus_number)
+
+    def open_gpio_chip(self, chip_name):
+        return SimGpioChip(self, chip_name)
+
+    def open_serial(self, port, baudrate, timeout):
+        with self.lock:
+            self.update()
+            if port != SERIAL_PORT_NAME or self.dut.state != SimPlaytron.APP:
+                raise OSError(errno.ENOENT, f"could not open port {port}")
+            serial_port = SimSerial(self, port, baudrate, timeout)
+            self.open_serials.append(serial_port)
+            return serial_port
+
+    def list_usb_serial_ports(self):
+        with self.lock:
+            self.update()
+            if self.dut.state != SimPlaytron.APP:
+                return []
+            return [{"device": SERIAL_PORT_NAME, "vid": USB_VID, "pid": USB_PID,
+                     "serial": self.dut.serial_number, "product": "Playtron"}]
+
+    def midi_get_output_names(self):
+        with self.lock:
+            self.update()
+            return [MIDI_PORT_NAME] if self.dut.state == SimPlaytron.APP else []
+
+    def midi_open_output(self, name):
+        if name not in self.midi_get_output_names():
+            raise OSError(errno.ENODEV, f"Unknown port {name}")
+        return SimMidiOutput(self, name)
+
+    def list_block_devices(self):
+        with self.lock:
+            self.update()
+            devices = [{"name": "mmcblk0", "vendor": None, "model": None}]
+            if self.dut.state == SimPlaytron.BOOTLOADER:
+                devices.append({"name": BLOCK_DEVICE_NAME, "vendor": UF2_DRIVE_VENDOR, "model": UF2_DRIVE_MODEL})
+            return devices
+
+    def block_device_present(self, name):
+        return any(device["name"] == name for device in self.list_block_devices())
+
+    def write_block_device(self, name, data):
+        if not self.block_device_present(name):
+            raise OSError(errno.ENOENT, f"No such block device {name}")
+        time.sleep(len(data) / USB_WRITE_RATE)
+        with self.lock:
+            self.update()
+            if self.dut.state != SimPlaytron.BOOTLOADER:
+                raise OSError(errno.EIO, f"Block device {name} went away during the write")
+            self.dut.receive_sectors(bytes(data), time.monotonic())
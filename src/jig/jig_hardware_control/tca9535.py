@@ -1,10 +1,14 @@
 import logging
 
-import smbus2 as smbus
+from .i2c_bus import shared_bus, PRIORITY_CRITICAL
 
 # Default TCA9535 address (can vary depending on A0-A2 pin settings)
 TCA9535_ADDRESS = 0x20
 
+# Input register (0x00 for port 0, 0x01 for port 1)
+INPUT_PORT_0 = 0x00
+INPUT_PORT_1 = 0x01
+
 # Configuration register (0x06 for port 0, 0x07 for port 1)
 CONFIG_PORT_0 = 0x06
 CONFIG_PORT_1 = 0x07
@@ -13,39 +17,111 @@ CONFIG_PORT_1 = 0x07
 OUTPUT_PORT_0 = 0x02
 OUTPUT_PORT_1 = 0x03
 
+_SHADOW_REGISTERS = {
+    OUTPUT_PORT_0: "output_port_0",
+    OUTPUT_PORT_1: "output_port_1",
+    CONFIG_PORT_0: "config_port_0",
+    CONFIG_PORT_1: "config_port_1",
+}
+
+
 class TCA9535:
+    """
+    TCA9535 expander driver.
+
+    The output and configuration registers are only ever written by this driver, so it keeps
+    shadow copies of them and never reads them back. Multi-pin helpers take 16-bit masks where
+    bit (8 * port + pin) is the pin, and write both ports in a single auto-increment block write.
+    """
     def __init__(self, i2c_address=TCA9535_ADDRESS, bus_number=1):
         self.address = i2c_address
-        self.bus = smbus.SMBus(bus_number)
+        self.bus = shared_bus(bus_number, PRIORITY_CRITICAL)
+
+        self.output_port_0 = 0x00
+        self.output_port_1 = 0x00
+        self.config_port_0 = 0x00
+        self.config_port_1 = 0x00
 
         # Set the output state of all pins to 0 (low) before setting configuration
-        self.write_register(OUTPUT_PORT_0, 0x00)  # Set all pins of port 0 to low
-        self.write_register(OUTPUT_PORT_1, 0x00)  # Set all pins of port 1 to low
+        self.write_register_pair(OUTPUT_PORT_0, 0x0000)
 
         # Now set the direction for all pins to output (0x00 means all pins are outputs)
-        self.config_port_0 = 0x00  # All pins of port 0 as output
-        self.config_port_1 = 0x00  # All pins of port 1 as output
-
-        # Write the configuration to the TCA9535
-        self.write_register(CONFIG_PORT_0, self.config_port_0)
-        self.write_register(CONFIG_PORT_1, self.config_port_1)
-
-        # Now that the configuration is set, read the initial state of output ports
-        self.output_port_0 = self.read_register(OUTPUT_PORT_0)  # Read current state of port 0
-        self.output_port_1 = self.read_register(OUTPUT_PORT_1)  # Read current state of port 1
+        self.write_register_pair(CONFIG_PORT_0, 0x0000)
 
         # Print the current state of the output ports
         logging.debug(f"Output Port 0: 0b{self.output_port_0:08b}")  # Using self.output_port_0
         logging.debug(f"Output Port 1: 0b{self.output_port_1:08b}")  # Using self.output_port_1
 
+    @property
+    def outputs(self):
+        """Shadow of both output registers (port 1 in the high byte)"""
+        return self.output_port_0 | (self.output_port_1 << 8)
+
+    @property
+    def config(self):
+        """Shadow of both configuration registers (port 1 in the high byte)"""
+        return self.config_port_0 | (self.config_port_1 << 8)
+
     def write_register(self, register, value):
         """Write a value to the specified register"""
         self.bus.write_byte_data(self.address, register, value)
+        self.__update_shadow(register, value)
 
     def read_register(self, register):
         """Read the value from the specified register"""
         return self.bus.read_byte_data(self.address, register)
 
+    def write_register_pair(self, register, value):
+        """Write a 16-bit value to a port 0/port 1 register pair in one transaction"""
+        self.bus.write_i2c_block_data(self.address, register, [value & 0xFF, (value >> 8) & 0xFF])
+        self.__update_shadow(register, value & 0xFF)
+        self.__update_shadow(register + 1, (value >> 8) & 0xFF)
+
+    def read_register_pair(self, register):
+        """Read a port 0/port 1 register pair in one transaction"""
+        data = self.bus.read_i2c_block_data(self.address, register, 2)
+        return data[0] | (data[1] << 8)
+
+    def __update_shadow(self, register, value):
+        if register in _SHADOW_REGISTERS:
+            setattr(self, _SHADOW_REGISTERS[register], value & 0xFF)
+
+    def __write_changes(self, register, current, new):
+        """Write only the ports of a register pair whose value changes"""
+        changed = current ^ new
+        if changed & 0x00FF and changed & 0xFF00:
+            self.write_register_pair(register, new)
+        elif changed & 0x00FF:
+            self.write_register(register, new & 0xFF)
+        elif changed & 0xFF00:
+            self.write_register(register + 1, new >> 8)
+
+    def update_outputs(self, mask, values):
+        """
+        Set the output state of any set of pins on both ports with at most one write.
+
+        mask: 16-bit mask of the pins to change
+        values: 16-bit states for those pins (1 - high, 0 - low)
+        """
+        with self.bus.transaction():  # the shadow read-modify-write must not interleave
+            current = self.outputs
+            self.__write_changes(OUTPUT_PORT_0, current, (current & ~mask) | (values & mask))
+
+    def update_config(self, mask, values):
+        """
+        Set the direction of any set of pins on both ports with at most one write.
+
+        mask: 16-bit mask of the pins to change
+        values: 16-bit directions for those pins (1 - input, 0 - output)
+        """
+        with self.bus.transaction():
+            current = self.config
+            self.__write_changes(CONFIG_PORT_0, current, (current & ~mask) | (values & mask))
+
+    def read_inputs(self):
+        """Read the input registers of both ports in one transaction (port 1 in the high byte)"""
+        return self.read_register_pair(INPUT_PORT_0)
+
     def set_pin(self, port, pin, state):
         """
         Set the state of an individual pin on a port.
@@ -54,35 +130,8 @@ class TCA9535:
         pin: Pin number (0-7)
         state: State (1 - high, 0 - low)
         """
-        if port == 0:
-            output_register = OUTPUT_PORT_0
-            current_state = self.read_register(OUTPUT_PORT_0)  # Read current state of port 0
-        elif port == 1:
-            output_register = OUTPUT_PORT_1
-            current_state = self.read_register(OUTPUT_PORT_1)  # Read current state of port 1
-        else:
+        if port not in (0, 1):
             raise ValueError("Invalid port number. Use 0 or 1.")
 
-        # Log current state after reading
-        #print(f"Current state of port {port} before modification: 0b{current_state:08b}")
-
-        if state:
-            current_state |= (1 << pin)  # Set bit
-        else:
-            current_state &= ~(1 << pin)  # Clear bit
-
-        # Write new state to the output register
-        self.write_register(output_register, current_state)
-
-        # Log current state after writing
-        #print(f"Current state of port {port} after modification: 0b{current_state:08b}")
-
-        # Read and log the state of the port again after writing to confirm
-        #new_state = self.read_register(output_register)
-        #print(f"Confirmed state of port {port} after writing: 0b{new_state:08b}")
-
-        # Update the local variable for port state
-        if port == 0:
-            self.output_port_0 = current_state
-        else:
-            self.output_port_1 = current_state
+        bit = 1 << (8 * port + pin)
+        self.update_outputs(bit, bit if state else 0)
@@ -0,0 +1,48 @@
+import time
+
+import variables
+from base_logger import get_logger_for_file
+from jig.jig_hardware_control.backends import midi_get_output_names
+from jig.tests.serial_tests import find_serial_port
+
+logger = get_logger_for_file(__name__)
+
+# Poll interval grows from the first to the last value between checks
+BOOT_POLL_INTERVAL_MIN = 0.05
+BOOT_POLL_INTERVAL_MAX = 0.5
+BOOT_POLL_BACKOFF = 1.5
+
+
+def is_midi_port_present():
+    return any("Playtron" in name for name in midi_get_output_names())
+
+
+def is_serial_port_present():
+    return find_serial_port() is not None
+
+
+def wait_for_device_ready(timeout=variables.BOOT_READY_TIMEOUT, should_stop=lambda: False):
+    """
+    Waits until the flashed device has enumerated with both its MIDI port and its CDC-ACM serial port.
+
+    Returns None when the device is ready, an error string on timeout or when should_stop() is true.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    interval = BOOT_POLL_INTERVAL_MIN
+    while True:
+        try:
+            if is_midi_port_present() and is_serial_port_present():
+                logger.info(f"Device ready in {time.monotonic() - start:.2f} s")
+                return
+        except Exception as e:
+            logger.warning(f"Failed to check the device ports: {e}")
+
+        if should_stop():
+            return "Boot wait interrupted"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warn(f"Device did not enumerate in {timeout} s")
+            return "Device did not boot"
+        time.sleep(min(interval, remaining))
+        interval = min(interval * BOOT_POLL_BACKOFF, BOOT_POLL_INTERVAL_MAX)
@@ -1,22 +1,20 @@
 import time
 
 from base_logger import get_logger_for_file
-from jig.jig_hardware_control.ads1015_4052 import MultiplexerADCReader
+from jig.jig_hardware_control import devices
 
 
 logger = get_logger_for_file(__name__)
 
-adc_read = MultiplexerADCReader()
-
 
 def led_tests():
-    for multiplexer_num in range(4):
-        for multiplexer_channel_num in range(4):
-            adc_val = adc_read.read_channel(multiplexer_num, multiplexer_channel_num)
-            logger.info(f"Value of multiplexer {multiplexer_num} {multiplexer_channel_num}: {adc_val}")
-            if adc_val >= 3:
-                logger.warning(f"Led on {multiplexer_num} {multiplexer_channel_num} does not work")
-                return "LED IS NOT WORKING"
+    # A lit LED pulls its multiplexer input below 3 V; the ADC comparator checks every position
+    failures = devices.multiplexer_reader().scan_window(max_value=3)
+
+    for multiplexer_num, multiplexer_channel_num, adc_val in failures:
+        logger.warning(f"Led on {multiplexer_num} {multiplexer_channel_num} does not work: {adc_val:.3f} V")
+    if failures:
+        return "LED IS NOT WORKING"
 
     return
 
@@ -1,106 +1,82 @@
-import os
-import shutil
-import re
-import subprocess
+import time
 
 import variables
 from base_logger import get_logger_for_file
+from firmware_catalog import catalog
+from jig.jig_hardware_control.backends import list_block_devices, block_device_present, write_block_device
 
 
 logger = get_logger_for_file(__name__)
 
+# How often the drive is checked for disappearing after the write
+FLASH_POLL_INTERVAL = 0.005
 
-firmware_file = None
-def get_firmware_file():
-    global firmware_file
-    if firmware_file and firmware_file.is_file():
-        logger.info(f"Use old firmware file {firmware_file}")
-        return firmware_file
+# Durations of the last flash: write (until fsync returned), reboot (until the drive left) and total, seconds
+last_flash_metrics = {}
 
-    firmware_file = None
 
-    files = [f for f in os.listdir(variables.FIRMWARE_PATH)
-             if os.path.isfile(os.path.join(variables.FIRMWARE_PATH, f)) and re.match(variables.FIRMWARE_PATTERN, f)
-    ]
-    if not files:
-        logger.warn("Don't see any firmware files")
-        return None
+def find_uf2_drive(vendor=variables.UF2_DRIVE_VENDOR, model=variables.UF2_DRIVE_MODEL):
+    """Returns the block device name (e.g. "sda") of the bootloader drive, or None."""
+    for device in list_block_devices():
+        if device["vendor"] == vendor and device["model"] == model:
+            return device["name"]
+    return None
 
-    files.sort()
-    file = files[-1]
-    if not file.endswith(".uf2"):
-        logger.warn(f"File from firmware dir is not firmware. {file}")
-        return None
 
-    firmware_file = variables.FIRMWARE_PATH / file
-    logger.info(f"Firmware file has been found. {file}")
-    return firmware_file
+def wait_for_drive_removal(name, timeout):
+    deadline = time.monotonic() + timeout
+    while block_device_present(name):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(FLASH_POLL_INTERVAL)
+    return True
 
 
-def mount_usb_drive(drive_name):
-    os.makedirs(variables.MOUNT_POINT, exist_ok=True)
-    try:
-        subprocess.run(['mount', f'/dev/{drive_name}', variables.MOUNT_POINT], check=True)
-        logger.info(f"Mounted /dev/{drive_name} at {variables.MOUNT_POINT}")
-    except subprocess.CalledProcessError as e:
-        logger.warn(f"Failed to mount /dev/{drive_name}: {e}")
-
-
-def is_device_connected():
-    lsblk_output = subprocess.check_output(['lsblk', '-o', 'NAME,TYPE,MOUNTPOINT'], text=True)
-
-    for line in lsblk_output.splitlines()[1:]:
-        parts = line.split()
-        logger.info(parts)
-        if len(parts) == 3 and parts[1] == 'part' and parts[2] == str(variables.MOUNT_POINT):
-            return True
-
-        if len(parts) == 2 and parts[1] == 'part':
-            mount_usb_drive(parts[0][2:])
-            return True
-
-    return False
-
+def flash_uf2_image(drive, image, timeout=variables.FLASH_TIMEOUT):
+    """
+    Writes the UF2 image to the raw bootloader drive and waits for the device to reboot.
 
-def unmount_usb_drive():
+    The bootloader programs every sector written to it that holds a UF2 block, so no file system
+    is mounted. Completion is the drive leaving /sys/block. Returns an error string or None.
+    """
+    last_flash_metrics.clear()
+    started = time.monotonic()
     try:
-        subprocess.run(['sudo', 'umount', variables.MOUNT_POINT], check=True)
-        logger.info(f"Umounted {variables.MOUNT_POINT}")
-    except subprocess.CalledProcessError as e:
-        logger.warn(f"Failed to unmount {variables.MOUNT_POINT}: {e}")
-
-
-def copy_firmware_to_usb_drive(source_file):
-    destination = os.path.join(variables.MOUNT_POINT, os.path.basename(source_file))
-    try:
-        shutil.copy2(source_file, destination)  # Copy the file
-        logger.info(f"File '{source_file}' has been copied to device.")
-        return True
-    except Exception as e:
-        logger.warn(f"Failed to copy to device: {e}")
-        return False
+        write_block_device(drive, image)
+    except OSError as e:
+        # The device may reboot as soon as its last block is programmed, before the flush returns
+        if block_device_present(drive):
+            logger.warn(f"Failed to write firmware to /dev/{drive}: {e}")
+            return "CP_FIRMWARE_ERROR"
+        logger.info(f"Drive left during the write: {e}")
+    written = time.monotonic()
+
+    if not wait_for_drive_removal(drive, timeout - (written - started)):
+        logger.warn(f"Drive /dev/{drive} is still present {timeout} s after the write")
+        return "FLASH_TIMEOUT"
+    finished = time.monotonic()
+
+    last_flash_metrics.update(bytes=len(image), write=written - started, reboot=finished - written,
+                              total=finished - started)
+    logger.info(f"Flashed {len(image)} bytes in {(finished - started) * 1000:.1f} ms "
+                f"(write {(written - started) * 1000:.1f} ms, reboot {(finished - written) * 1000:.1f} ms)")
 
 
 def load_firmware_to_device():
-    source_file = get_firmware_file()
-    if not source_file:
+    image = catalog.latest()
+    if image is None:
         logger.warn("Some problem with loading firmware file")
         return "FIRMWARE_NOT_FOUND"
-    logger.info(f"Firmware has been found")
+    logger.info(f"Firmware {image.version_string} has been found")
 
-    if not is_device_connected():
+    drive = find_uf2_drive()
+    if drive is None:
         logger.warn("Cant find any devices")
         return "DEVICE_NOT_FOUND"
-    logger.info(f"Device has been found")
-
-    if not copy_firmware_to_usb_drive(source_file):
-        logger.warn("Failed to copy firmware file")
-        return "CP_FIRMWARE_ERROR"
-
-    logger.info(f"Firmware has been copied to usb drive")
-
+    logger.info(f"Device has been found at /dev/{drive}")
 
+    return flash_uf2_image(drive, image.data)
 
 
 if __name__ == "__main__":
-    load_firmware_to_device()
\ No newline at end of file
+    load_firmware_to_device()
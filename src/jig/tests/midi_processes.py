@@ -1,15 +1,13 @@
 import time
 
-import mido
-import mido.backends.rtmidi
-
 from base_logger import get_logger_for_file
+from jig.jig_hardware_control.backends import midi_get_output_names, midi_open_output
 logger = get_logger_for_file(__name__)
 
 midi_output = None
 
-sysex_test_mode = mido.Message.from_bytes([240, 11, 20, 13, 0, 247])
-sysex_enable_logs = mido.Message.from_bytes([240, 11, 20, 13, 2, 247])
+sysex_test_mode = [240, 11, 20, 13, 0, 247]
+sysex_enable_logs = [240, 11, 20, 13, 2, 247]
 
 def find_midi_device():
     try:
@@ -18,11 +16,12 @@ def find_midi_device():
             logger.info("Device has already been initialized")
             return "Device has already been Found"
 
-        print(mido.get_output_names())
-        for output_device in mido.get_output_names():
+        output_names = midi_get_output_names()
+        print(output_names)
+        for output_device in output_names:
             if "Playtron" in output_device:
                 logger.info("Playtron was found")
-                midi_output = mido.open_output(output_device)
+                midi_output = midi_open_output(output_device)
                 return
         return "Device Not Found"
     except Exception as e:
@@ -50,7 +49,8 @@ def send_sysex_messages_to_midi_device(sysex_message):
             logger.warn("MIDI Device is not found")
             return "Device Not Found"
 
-        midi_output.send(sysex_message)
+        import mido  # slow to import, loaded when the MIDI stage first runs
+        midi_output.send(mido.Message.from_bytes(sysex_message))
         time.sleep(0.1)
     except Exception as e:
         logger.error(f"Some error while sending debug sys ex: {e}")
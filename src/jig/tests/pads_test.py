@@ -1,36 +1,82 @@
-import time
+import statistics
 
+import variables
 from base_logger import get_logger_for_file
-from jig.jig_hardware_control.ads1015_4052 import MultiplexerADCReader
-from jig.tests.serial_tests import SerialTests
+from jig.jig_hardware_control import devices
 
-adc_read = MultiplexerADCReader()
 logger = get_logger_for_file(__name__)
 
+# The longest a pad stays touched waiting for its "pressed" event. The original test took the event
+# ~40 ms after the touch (20 ms settle, conversion, 20 ms hold); this leaves over 5x that, and only
+# a pad that does not answer ever waits it out.
+PADS_RESPONSE_TIMEOUT = 0.25
+# Confirmed actuations wanted from every pad (enough for a min/median/max), and sweeps over the
+# unconfirmed ones before giving up
+PADS_ACTUATIONS = 3
+PADS_MAX_SWEEPS = 2
+
+# Actuation -> "pressed" latencies of the last run, seconds by pad_id
+last_latencies = {}
+
+
+def latency_report(latencies):
+    """{pad_id: (min, median, max)} of the latencies in seconds."""
+    return {
+        pad_id: (min(values), statistics.median(values), max(values))
+        for pad_id, values in sorted(latencies.items()) if values
+    }
+
+
+def expected_pad_id(adc_read, multiplexer_num, multiplexer_channel_num):
+    """pad_id the input must report, None if any pad_id is accepted (variables.PAD_IDS not set)."""
+    if variables.PAD_IDS is None:
+        return None
+    return variables.PAD_IDS[adc_read.channel_index(multiplexer_num, multiplexer_channel_num)]
 
-serial = SerialTests()
 
 def pads_test():
-    pads_id = set()
-    for multiplexer_num in range(4):
-        for multiplexer_channel_num in range(4):
-            adc_read.read_channel(multiplexer_num, multiplexer_channel_num)
-            data = serial.last_data.copy()
-            logger.info(data)
+    adc_read = devices.multiplexer_reader()
+    serial = devices.serial_tests()
 
-            if ("status" not in data) or (data["status"] != "pressed"):
-                logger.warn("Strange json")
-                return "STRANGE JSON"
+    last_latencies.clear()
+    reported = {}  # (multiplexer, channel) -> pad_ids it reported
+    pending = []
+    for pad in adc_read.scan_order():
+        reported[pad] = set()
+        pending.extend([pad] * PADS_ACTUATIONS)
 
-            if ("pad_id" not in data) or (type(data["pad_id"]) is not int):
-                logger.warn("Strange json")
-                return "STRANGE JSON"
+    for _ in range(PADS_MAX_SWEEPS):
+        missed = []
+        for multiplexer_num, multiplexer_channel_num, touched_at in adc_read.actuate_iter(pending):
+            expected = expected_pad_id(adc_read, multiplexer_num, multiplexer_channel_num)
+            # Held until the DUT reports a press (of exactly this pad, if the map is known)
+            received = serial.wait_for(
+                lambda event: event.get("status") == "pressed" and type(event.get("pad_id")) is int
+                and expected in (None, event["pad_id"]),
+                PADS_RESPONSE_TIMEOUT, since=touched_at)
+            if received is None:
+                logger.warn(f"No response to pad {expected} on {multiplexer_num} {multiplexer_channel_num}")
+                missed.append((multiplexer_num, multiplexer_channel_num))
+                continue
+            pad_id = received[1]["pad_id"]
+            reported[(multiplexer_num, multiplexer_channel_num)].add(pad_id)
+            last_latencies.setdefault(pad_id, []).append(received[0] - touched_at)
 
-            pads_id.add(data["pad_id"])
+        pending = missed
+        if not pending:
+            break
 
-    if set(range(16)) != pads_id:
-        logger.warn("Not all pads or redundant")
+    for pad_id, (fastest, median, slowest) in latency_report(last_latencies).items():
+        logger.info(f"Pad {pad_id}: {fastest * 1000:.1f} / {median * 1000:.1f} / {slowest * 1000:.1f} ms")
+
+    if pending:
+        logger.warn(f"Pads not confirmed: {sorted(set(pending))}")
         return "PADS NOT CORRECT"
 
-    return
+    # Every input reports one pad_id of its own, and together they are 0..n-1
+    pad_ids = [pad_id for pad_ids in reported.values() for pad_id in pad_ids]
+    if any(len(pad_ids) != 1 for pad_ids in reported.values()) or sorted(pad_ids) != list(range(len(reported))):
+        logger.warn(f"Not all pads or redundant: {reported}")
+        return "PADS NOT CORRECT"
 
+    return
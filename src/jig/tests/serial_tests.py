@@ -1,31 +1,61 @@
-import serial
-from threading import Thread
+import json
+import time
+from collections import deque
+from threading import Thread, Condition
+
+import variables
 from base_logger import get_logger_for_file
+from jig.jig_hardware_control.backends import open_serial, list_usb_serial_ports
 
 
 logger = get_logger_for_file(__name__)
 
-class SerialTests:
-    _instance = None
+# Events kept for wait_for(); a test cycle produces a few dozen
+SERIAL_EVENTS_BUFFER_SIZE = 256
+# Longest wait for data, bounds how long stop_serial takes
+SERIAL_READ_TIMEOUT = 0.1
+# A line longer than this without a newline is garbage and is dropped
+SERIAL_MAX_LINE_LENGTH = 4096
+
+
+def find_serial_port(product=variables.SERIAL_USB_PRODUCT, vid=variables.SERIAL_USB_VID,
+                     pid=variables.SERIAL_USB_PID, serial_number=variables.SERIAL_USB_SERIAL_NUMBER):
+    """Returns the device path of the first USB CDC-ACM port matching the ids (None matches any), or None."""
+    wanted = {"product": product, "vid": vid, "pid": pid, "serial": serial_number}
+    for port in list_usb_serial_ports():
+        if all(value is None or port[key] == value for key, value in wanted.items()):
+            return port["device"]
+    return None
 
+
+class SerialTests:
     def __init__(self):
         self.is_enabled = False
         self.serial = None
         self.thread = None
 
-        self.last_data = {}
+        # (sequence number, time.monotonic() of arrival, event) of the latest events
+        self.condition = Condition()
+        self.events = deque(maxlen=SERIAL_EVENTS_BUFFER_SIZE)
+        self.sequence = 0
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    @property
+    def last_data(self):
+        with self.condition:
+            return self.events[-1][2] if self.events else {}
 
-    def start_serial(self):
+    def start_serial(self, baudrate=variables.SERIAL_BAUDRATE):
         if self.is_enabled:
             logger.warn("Serial thread has already been enabled")
             return "SERIAL ALREADY ENABLED"
+        port = find_serial_port()
+        if port is None:
+            logger.warn("Serial port of the device is not found")
+            return "SERIAL PORT NOT FOUND"
         self.is_enabled = True
-        self.serial = serial.Serial("/dev/ttyACM0", 115200, timeout=1)
+        with self.condition:
+            self.events.clear()
+        self.serial = open_serial(port, baudrate, timeout=SERIAL_READ_TIMEOUT)
         self.thread = Thread(target=self.__process)
         self.thread.start()
 
@@ -40,18 +70,70 @@ class SerialTests:
         self.serial = None
         self.thread = None
 
+    def wait_for(self, predicate, timeout, since=None):
+        """
+        Blocks until an event received at or after `since` satisfies predicate(event).
+
+        since: time.monotonic() value; None - only events arriving from now on.
+        Returns (timestamp, event), or None if the timeout passed first.
+        """
+        deadline = time.monotonic() + timeout
+        if since is None:
+            since = time.monotonic()
+
+        with self.condition:
+            checked = 0  # events up to this sequence number have been looked at
+            while True:
+                for sequence, timestamp, event in self.events:
+                    if sequence >= checked and timestamp >= since and predicate(event):
+                        return timestamp, event
+                checked = self.sequence
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def __record(self, timestamp, event):
+        with self.condition:
+            self.events.append((self.sequence, timestamp, event))
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def __parse_line(self, line, timestamp):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            logger.warn(f"Some problems with logs {bytes(line)}")
+            return
+        self.__record(timestamp, event)
+
     def __process(self):
         try:
+            buffer = bytearray()
             while self.is_enabled:
-                line = self.serial.readline().decode("ascii")
-                if not line or line[0] != "{":
-                    logger.warn(f"Some problems with logs {line}")
+                # Everything the driver has buffered in one call, or wait for the next byte
+                data = self.serial.read(self.serial.in_waiting or 1)
+                if not data:
                     continue
-                self.last_data = eval(line)
+                timestamp = time.monotonic()
+                buffer += data
+
+                start = 0
+                while (end := buffer.find(b"\n", start)) >= 0:
+                    self.__parse_line(buffer[start:end], timestamp)
+                    start = end + 1
+                del buffer[:start]
+
+                if len(buffer) > SERIAL_MAX_LINE_LENGTH:
+                    logger.warn(f"Dropped {len(buffer)} bytes of serial data without a line end")
+                    buffer.clear()
 
         except Exception as e:
             logger.error("Exception while reading serial data: {}".format(e))
             self.is_enabled = False
             self.serial.close()
             self.serial = None
-            self.thread = None
\ No newline at end of file
+            self.thread = None
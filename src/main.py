@@ -1,13 +1,11 @@
-import re
-
 import variables
 
 from base_logger import get_logger_for_file
 import subprocess
+import threading
 
-from firmware_updater import update_firmware_files
+from firmware_catalog import catalog
 from jig.JigEnvironment import JigEnvironment
-from jig.tests.load_firmware_to_device import load_firmware_to_device
 
 logger = get_logger_for_file(__name__)
 
@@ -20,47 +18,43 @@ def check_internet_connection():
     except subprocess.CalledProcessError:
         logger.error("Internet connection error")
         return False
+    except OSError as e:
+        logger.error(f"Failed to run ping: {e}")
+        return False
 
 
-def initial_part():
-    res = check_internet_connection()
-    if res:
-        update_firmware_files('Playtronica', 'playtron-releases')
-    else:
-        logger.error("Internet connection error")
-
-    # TODO Was written without device in hands, rewrite when is possible
-    import os
-    files = [f for f in os.listdir(variables.FIRMWARE_PATH) if os.path.isfile(os.path.join(variables.FIRMWARE_PATH, f))
-             and re.match(variables.FIRMWARE_PATTERN, f)]
-    if not files:
-        logger.warn("Don't see any firmware files")
-        return None
-
-    files.sort()
-    file = files[-1]
-    if not file.endswith(".uf2"):
-        logger.warn(f"File from firmware dir is not firmware. {file}")
-        return None
+def show_firmware_version(screen):
+    """Puts the version of the firmware the next unit gets on the LCD."""
+    image = catalog.latest()
+    if image is None:
+        return
 
-    version_str = file.split('_v')[-1].split('.uf2')[0]
+    if image.display_version != variables.DEVICE_FIRMWARE_VERSION:
+        variables.DEVICE_FIRMWARE_VERSION = image.display_version
+        screen.refresh()
 
-    major, minor, patch = version_str.split('.')
 
-    custom_major = major[-1]
-    custom_minor = minor.zfill(2) if len(minor) < 2 else minor[-2:]
-    custom_patch = patch.zfill(2) if len(patch) < 2 else patch[-2:]
+def sync_firmware(screen):
+    """
+    Background part of the startup, the jig takes devices meanwhile. Every flash takes the newest
+    image from the catalog, so a downloaded release is used from the next unit on, while a unit in
+    progress keeps its image. Errors are logged, the thread must not die silently.
+    """
+    try:
+        show_firmware_version(screen)
+        from firmware_updater import update_firmware_files  # requests and urllib3, only needed here
 
-    custom_version = f"{custom_major}.{custom_minor}.{custom_patch}"
-    variables.DEVICE_FIRMWARE_VERSION = custom_version
+        if check_internet_connection():
+            if update_firmware_files('Playtronica', 'playtron-releases'):
+                show_firmware_version(screen)
+        else:
+            logger.error("Internet connection error")
+    except Exception:
+        logger.exception("Firmware sync failed")
 
 
 if __name__ == '__main__':
-    initial_part()
-    print(variables.DEVICE_FIRMWARE_VERSION)
-
     jig = JigEnvironment()
-    jig.init_jig_main_cycle()
-
-
+    threading.Thread(target=sync_firmware, args=(jig.screen,), name="firmware-sync", daemon=True).start()
 
+    jig.init_jig_main_cycle()
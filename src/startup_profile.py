@@ -0,0 +1,144 @@
+"""
+Startup profile of the jig: what a cold start spends on imports and on driver initialisation
+before CONNECT DEVICE is on the screen.
+
+A fresh interpreter is started with -X importtime, imports main, builds JigEnvironment and
+enters the main loop until the first screen is rendered. Exits with status 1 if that takes
+longer than the budget, so it can gate changes (run it with the jig service stopped).
+
+    python3 src/startup_profile.py
+    JIG_HARDWARE_BACKEND=simulation python3 src/startup_profile.py --budget 1.0
+"""
+import sys
+import time
+
+CHILD_FLAG = "--child"
+
+
+def child():
+    """Runs in the profiled interpreter; keep imports out of the module top to not skew them."""
+    import_started = time.perf_counter()
+    import main
+    import_time = time.perf_counter() - import_started
+
+    import logging
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    import threading
+    from jig.jig_hardware_control import devices
+
+    init_started = time.perf_counter()
+    jig = main.JigEnvironment()
+    init_time = time.perf_counter() - init_started
+
+    threading.Thread(target=jig.init_jig_main_cycle, daemon=True).start()
+    while jig.screen.text != "CONNECT DEVICE":
+        time.sleep(0.001)
+    jig.screen.flush()
+    ready_at = time.time()
+
+    import json
+    import os
+    print(json.dumps({
+        "import": import_time,
+        "init": init_time,
+        "screen": time.perf_counter() - init_started - init_time,
+        "devices": devices.creation_times,
+        "ready_at": ready_at,
+    }))
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)  # leave the main loop and the driver threads behind
+
+
+def parse_importtime(output):
+    """(level, module, self seconds, cumulative seconds) of every -X importtime line, in output order."""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        module = name.strip()
+        # one space after the separator, then two per nesting level
+        level = (len(name.rstrip()) - len(module) - 1) // 2
+        entries.append((level, module, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return entries
+
+
+def import_phases(entries, root="main"):
+    """
+    Splits top level imports into the ones under `root` and the ones after it (deferred imports
+    done while the drivers start). Nested modules are listed before their parent.
+    """
+    root_index = next(index for index, entry in enumerate(entries) if entry[0] == 0 and entry[1] == root)
+    start = root_index
+    while start > 0 and entries[start - 1][0] > 0:
+        start -= 1
+    return entries[start:root_index + 1], entries[root_index + 1:]
+
+
+def package_costs(entries):
+    """Self time summed per top level package, most expensive first."""
+    costs = {}
+    for _, module, self_time, _ in entries:
+        package = module.split(".")[0]
+        costs[package] = costs.get(package, 0.0) + self_time
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    import argparse
+    import json
+    import os
+    import subprocess
+
+    import variables
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=variables.STARTUP_TIME_BUDGET,
+                        help="longest allowed time from process start to the first screen, seconds")
+    parser.add_argument("--top", type=int, default=12, help="packages and modules listed")
+    args = parser.parse_args()
+
+    source_path = os.path.dirname(os.path.abspath(__file__))
+    started_at = time.time()
+    process = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), CHILD_FLAG],
+                             cwd=source_path, capture_output=True, text=True, timeout=60)
+    if process.returncode != 0 or not process.stdout.strip():
+        print(process.stderr[-2000:])
+        print(f"Startup failed with status {process.returncode}")
+        sys.exit(2)
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(process.stderr)
+    imported, deferred = import_phases(entries)
+    startup = result["ready_at"] - started_at
+
+    print(f"Import main:      {result['import'] * 1000:8.1f} ms ({len(imported)} modules)")
+    for package, cost in package_costs(imported)[:args.top]:
+        print(f"  {package:<28}{cost * 1000:8.1f} ms")
+    print("Slowest modules:")
+    for _, module, self_time, _ in sorted(imported, key=lambda entry: entry[2], reverse=True)[:args.top]:
+        print(f"  {module:<28}{self_time * 1000:8.1f} ms")
+
+    print(f"Hardware init:    {result['init'] * 1000:8.1f} ms")
+    for name, seconds in sorted(result["devices"].items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:<28}{seconds * 1000:8.1f} ms")
+    deferred_top = [entry for entry in deferred if entry[0] == 0]
+    if deferred_top:
+        print("  imported on the way: " + ", ".join(
+            f"{module} {cumulative * 1000:.1f} ms" for _, module, _, cumulative in
+            sorted(deferred_top, key=lambda entry: entry[3], reverse=True)[:args.top]))
+    print(f"First screen:     {result['screen'] * 1000:8.1f} ms")
+
+    print()
+    print(f"Startup:          {startup:8.3f} s (budget {args.budget:.3f} s)")
+    if startup > args.budget:
+        print("Startup is over budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    if CHILD_FLAG in sys.argv:
+        child()
+    else:
+        main()
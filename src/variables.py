@@ -8,14 +8,31 @@ DEVICE_FIRMWARE_VERSION = "0.00.00"
 ROOT_PATH = Path(__file__).parent.parent
 FIRMWARE_PATH = ROOT_PATH / "firmware"
 os.makedirs(FIRMWARE_PATH, exist_ok=True)
+# GitHub API root used by firmware_updater.py, overridable for a local mirror or test server
+FIRMWARE_API_URL = os.environ.get("JIG_FIRMWARE_API_URL", "https://api.github.com")
 
 LOGGER_PATH = ROOT_PATH / "logs"
 os.makedirs(LOGGER_PATH, exist_ok=True)
 
+# Per-fixture calibration results (see src/calibrate.py)
+CALIBRATION_PATH = ROOT_PATH / "calibration"
+os.makedirs(CALIBRATION_PATH, exist_ok=True)
+
 MAX_TEST_TIME = 70
+# Longest time from process start until CONNECT DEVICE is on the screen (src/startup_profile.py)
+STARTUP_TIME_BUDGET = 3.0
+# Longest time for the flashed device to show up on USB (MIDI and serial) before the test fails
+BOOT_READY_TIMEOUT = 15
+
+# "hardware" or "simulation" (in-memory jig model, see jig_hardware_control/simulation.py)
+HARDWARE_BACKEND = os.environ.get("JIG_HARDWARE_BACKEND", "hardware")
 
-MOUNT_POINT = Path("/media/usb")
-FIRMWARE_PATTERN = r"playtron-firmware_v\d+\.\d+\.\d+\.uf2"
+# SCSI vendor and model of the RP2040 bootloader drive in /sys/block/*/device
+UF2_DRIVE_VENDOR = "RPI"
+UF2_DRIVE_MODEL = "RP2"
+FLASH_TIMEOUT = 10  # seconds from the start of the write until the drive disappears
+FIRMWARE_PATTERN = r"playtron-firmware_v(\d+)\.(\d+)\.(\d+)\.uf2"
+UF2_FAMILY_ID = 0xE48BFF56  # RP2040, images for other chips are rejected
 
 SCREEN_ADDRESS = 0x27
 SCREEN_ROWS = 2
@@ -26,9 +43,70 @@ RGB_LED_GREEN_PIN = 6
 RGB_LED_BLUE_PIN = 13
 RGB_LED_CHIP_NAME = "/dev/gpiochip0"
 
+# TCA9535 INT output (open drain, active low) wired to a Pi GPIO (BCM numbering), used to wait for
+# lever changes without polling the expander. None - inputs are polled every INPUT_POLL_INTERVAL.
+# Off until the INT wiring is confirmed on the fixture: with an unconnected line no edge ever
+# arrives and lever changes would only be seen by the 1 s re-reads. JIG_TCA9535_INT_PIN=4 enables it.
+TCA9535_INT_CHIP_NAME = "/dev/gpiochip0"
+TCA9535_INT_PIN = int(os.environ["JIG_TCA9535_INT_PIN"]) if os.environ.get("JIG_TCA9535_INT_PIN") else None
+INPUT_POLL_INTERVAL = 0.01
+INPUT_DEBOUNCE_TIME = 0.05
+
+# DUT serial (CDC-ACM) port, found in sysfs by its USB ids; None matches anything
+SERIAL_USB_PRODUCT = "Playtron"
+SERIAL_USB_VID = None
+SERIAL_USB_PID = None
+SERIAL_USB_SERIAL_NUMBER = None
+SERIAL_BAUDRATE = 115200
+
 PHOTORESISTOR_SAMPLES = 5
 
 PlANTS_SAMPLES = 5
 
 LED_TEST_BLUE_LEDS_MIN_REQ = 3.2
 LED_TEST_GREEN_LEDS_MIN_REQ = 2.7
+
+# ALERT/RDY pins of the ADS1015 chips wired to the Pi ({i2c address: line}), used as conversion-ready
+# signals and by the window comparator. Empty - conversion end is detected by polling the OS bit over
+# I2C. ALERT/RDY is not wired on the current jig, so the comparator path is off: LED window checks
+# read the conversion register and compare the code on the host.
+ADS1015_ALERT_CHIP_NAME = "/dev/gpiochip0"
+ADS1015_ALERT_PINS = {}
+
+ADC_CALIBRATION_PATH = CALIBRATION_PATH / "adc_calibration.npz"
+
+# Boot sequence delays (jig_hardware_control/boot_sequencer.py), "default" if the profile is not calibrated
+BOOT_TIMING_PATH = CALIBRATION_PATH / "boot_timing.json"
+BOOT_TIMING_PROFILE = os.environ.get("JIG_BOOT_TIMING_PROFILE", "calibrated")
+
+# Analog multiplexers on the TCA9535 port 0: select pins LSB first, one enable pin per multiplexer
+MUX_TOPOLOGIES = {
+    # 4 x 4052 (4 channels each), the LED and pad test fixture
+    "4052": {"select_pins": (1, 2), "enable_pins": (3, 4, 5, 6), "enable_active_low": True, "adc_channel": 0},
+    # 2 x 4051 (8 channels each), earlier fixture revision
+    "4051": {"select_pins": (1, 2, 3), "enable_pins": (4, 5), "enable_active_low": True, "adc_channel": 0},
+}
+MUX_TOPOLOGY = os.environ.get("JIG_MUX_TOPOLOGY", "4052")
+# pad_id the DUT must report for every multiplexer input, by channel index (multiplexer * channels +
+# channel), e.g. tuple(range(16)). None until the map is checked on the fixture: every input must then
+# report one pad_id of its own, in any order, as in the original test.
+PAD_IDS = None
+
+# "adaptive" - convert until consecutive readings agree (mux_settling.py), "fixed" - 20 ms waits
+MUX_SETTLE_MODE = "adaptive"
+MUX_SETTLE_FIXED_TIME = 0.02  # s, the "fixed" wait; also used for channels without a calibrated entry
+MUX_SETTLE_MIN_TIME = 0.002  # s, shortest wait after switching, whatever the calibration measured
+MUX_SETTLE_TOLERANCE = 0.02  # V, after the voltage divider compensation
+MUX_SETTLE_MAX_SAMPLES = 20
+MUX_SETTLE_MARGIN = 1.5
+MUX_SETTLE_PROFILE_PATH = CALIBRATION_PATH / "mux_settle_profile.json"
+
+
+def set_calibration_path(path):
+    """Moves the calibration files to another directory, e.g. the simulated jig's own."""
+    global CALIBRATION_PATH, ADC_CALIBRATION_PATH, BOOT_TIMING_PATH, MUX_SETTLE_PROFILE_PATH
+    CALIBRATION_PATH = path
+    os.makedirs(CALIBRATION_PATH, exist_ok=True)
+    ADC_CALIBRATION_PATH = CALIBRATION_PATH / ADC_CALIBRATION_PATH.name
+    BOOT_TIMING_PATH = CALIBRATION_PATH / BOOT_TIMING_PATH.name
+    MUX_SETTLE_PROFILE_PATH = CALIBRATION_PATH / MUX_SETTLE_PROFILE_PATH.name